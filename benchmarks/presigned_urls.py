@@ -0,0 +1,79 @@
+"""
+Per-request cost of presigning photo uploads in get_presigned_urls: a new
+boto3 client and one generate_presigned_url call per photo (as before)
+vs the shared client, and vs presign_puts() signing the batch in one pass.
+
+    python -m benchmarks.presigned_urls [photos]
+
+Runs against moto's S3 server on localhost, which also takes an upload
+through each kind of URL, so no AWS account or database is needed
+(settings still read the usual environment variables).
+"""
+import logging
+import os
+import sys
+import timeit
+
+from moto.server import ThreadedMotoServer
+
+_server = ThreadedMotoServer(port=0, verbose=False)
+_server.start()
+os.environ['AWS_S3_ENDPOINT_URL'] = 'http://{}:{}'.format(*_server.get_host_and_port())
+
+import boto3  # noqa: E402
+import django  # noqa: E402
+import requests  # noqa: E402
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'topfive.settings')
+django.setup()
+# moto's request log
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+from django.conf import settings  # noqa: E402
+
+from users.storage import photo_key, presign_puts, s3_client  # noqa: E402
+
+
+def presign_with_new_client(keys):
+    client = boto3.client('s3',
+                          aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                          aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                          region_name=settings.AWS_S3_REGION_NAME,
+                          endpoint_url=settings.AWS_S3_ENDPOINT_URL)
+    return [client.generate_presigned_url(
+        'put_object', Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key},
+        ExpiresIn=settings.PRESIGNED_URL_EXPIRY) for key in keys]
+
+
+def presign_with_shared_client(keys):
+    client = s3_client()
+    return [client.generate_presigned_url(
+        'put_object', Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key},
+        ExpiresIn=settings.PRESIGNED_URL_EXPIRY) for key in keys]
+
+
+def check_upload(url: str, key: str) -> None:
+    body = os.urandom(64)
+    requests.put(url, data=body).raise_for_status()
+    stored = s3_client().get_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)
+    assert stored['Body'].read() == body, key
+
+
+def main(photos: int = 6, repeat: int = 20) -> None:
+    s3_client().create_bucket(Bucket=settings.AWS_STORAGE_BUCKET_NAME)
+    keys = [photo_key(1, i) for i in range(photos)]
+    print(f'presigning {photos} upload URLs per request')
+    baseline = None
+    for name, presign in [('new client, serial', presign_with_new_client),
+                          ('shared client, serial', presign_with_shared_client),
+                          ('presign_puts batch', presign_puts)]:
+        for key, url in zip(keys, presign(keys)):
+            check_upload(url, key)
+        seconds = min(timeit.repeat(lambda: presign(keys), number=repeat, repeat=3)) / repeat
+        baseline = baseline or seconds
+        print(f'  {name:22s} {seconds * 1e3:8.3f} ms/request  ({baseline / seconds:.0f}x)')
+    _server.stop()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
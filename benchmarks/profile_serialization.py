@@ -0,0 +1,74 @@
+"""
+Per-profile cost of ProfileSerializer vs the compiled serialize_profile.
+
+    python -m benchmarks.profile_serialization [count]
+
+Runs on in-memory profiles, so no database is needed (settings still read
+the usual environment variables).
+"""
+import os
+import sys
+import timeit
+from datetime import date, datetime, timezone
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'topfive.settings')
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from users.models import Profile, Prompt, PromptResponse, User  # noqa: E402
+from users.serializers import ProfileSerializer, serialize_profile  # noqa: E402
+
+
+def _prefetched(queryset, items):
+    queryset._result_cache = list(items)
+    queryset._prefetch_done = True
+    return queryset
+
+
+def make_profile(i: int) -> Profile:
+    user = User(id=i, email=f'user{i}@example.com', first_name='Sam',
+                last_name='Lee', birthdate=date(1990, 1, 1 + i % 28))
+    profile = Profile(
+        id=i, user=user, bio='Hi there', gender='female', preferred_gender='male',
+        location='Austin, TX', height=170, interests=['books', 'music', 'hiking'],
+        love_languages=['time', 'words'], pronouns=['she_her'],
+        photos={'0': {'key': f'user_{i}/photo_0.jpg', 'hash': '9f2c4e1a7b3d5c60',
+                      'width': 1080, 'height': 1350,
+                      'derivatives': {'thumb': f'user_{i}/photo_0_thumb_9f2c4e1a7b3d5c60.jpg'}}},
+        picture_urls=[f'https://example.com/user_{i}/photo_0.jpg?v=9f2c4e1a7b3d5c60'],
+        religion='agnostic', zodiac_sign=None, max_distance=25,
+    )
+    prompts = [Prompt(id=n, text=f'Prompt {n}') for n in range(3)]
+    stamp = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    responses = [PromptResponse(id=n, profile=profile, prompt=prompt, response='Answer',
+                                created_at=stamp, updated_at=stamp)
+                 for n, prompt in enumerate(prompts)]
+    profile._prefetched_objects_cache = {
+        'prompts': _prefetched(Prompt.objects.all(), prompts),
+        'promptresponse_set': _prefetched(PromptResponse.objects.all(), responses),
+    }
+    return profile
+
+
+def main(count: int = 2000) -> None:
+    profiles = [make_profile(i) for i in range(1, count + 1)]
+    renderer = JSONRenderer()
+    for profile in profiles[:50]:
+        expected = renderer.render(ProfileSerializer(profile).data)
+        assert renderer.render(serialize_profile(profile)) == expected, profile.id
+
+    drf = min(timeit.repeat(
+        lambda: [ProfileSerializer(p).data for p in profiles], number=1, repeat=3))
+    fast = min(timeit.repeat(
+        lambda: [serialize_profile(p) for p in profiles], number=1, repeat=3))
+    print(f'{count} profiles, output identical')
+    print(f'ProfileSerializer:  {drf / count * 1e6:8.1f} us/profile')
+    print(f'serialize_profile:  {fast / count * 1e6:8.1f} us/profile '
+          f'({drf / fast:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,70 @@
+"""
+Encode time and size of JSON vs MessagePack for the API payload shapes in
+users/types.py: a feed page (PotentialMatchesResponse of MatchData) and a
+batch of full profiles (ProfileData plus the serializer's extra keys).
+
+    python -m benchmarks.response_formats [count]
+
+Runs on in-memory data, so no database is needed (settings still read the
+usual environment variables).
+"""
+import json
+import os
+import sys
+import timeit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'topfive.settings')
+django.setup()
+
+import msgpack  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from benchmarks.profile_serialization import make_profile  # noqa: E402
+from users.pagination import encode_cursor  # noqa: E402
+from users.renderers import MessagePackRenderer  # noqa: E402
+from users.serializers import serialize_profile  # noqa: E402
+
+
+def feed_page(count: int) -> dict:
+    return {
+        'potential_matches': [
+            {'id': i, 'first_name': 'Sam',
+             'picture_url': f'https://example.com/user_{i}/photo_0.jpg?t=1714566600'}
+            for i in range(1, count + 1)
+        ],
+        'next_cursor': encode_cursor(count),
+    }
+
+
+def profiles(count: int) -> dict:
+    return {
+        'profiles': [serialize_profile(make_profile(i)) for i in range(1, count + 1)],
+        'not_found': [],
+    }
+
+
+def compare(name: str, data: dict, repeat: int = 200) -> None:
+    json_renderer, msgpack_renderer = JSONRenderer(), MessagePackRenderer()
+    as_json = json_renderer.render(data)
+    as_msgpack = msgpack_renderer.render(data)
+    assert msgpack.unpackb(as_msgpack, raw=False) == json.loads(as_json), name
+    json_time = min(timeit.repeat(
+        lambda: json_renderer.render(data), number=repeat, repeat=3)) / repeat
+    msgpack_time = min(timeit.repeat(
+        lambda: msgpack_renderer.render(data), number=repeat, repeat=3)) / repeat
+    print(f'{name}')
+    print(f'  JSON:        {json_time * 1e6:9.1f} us  {len(as_json):8d} bytes')
+    print(f'  MessagePack: {msgpack_time * 1e6:9.1f} us  {len(as_msgpack):8d} bytes '
+          f'({json_time / msgpack_time:.1f}x faster, '
+          f'{100 * (1 - len(as_msgpack) / len(as_json)):.0f}% smaller)')
+
+
+def main(count: int = 50) -> None:
+    compare(f'feed page of {count} MatchData', feed_page(count))
+    compare(f'{count} full profiles', profiles(count))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -2,6 +2,8 @@
 ASGI config for topfive project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Async views such as users.login.token_login only avoid tying up a worker
+per request when served through this entry point.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
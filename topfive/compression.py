@@ -0,0 +1,132 @@
+"""
+Response compression negotiated from Accept-Encoding: zstd when the client
+takes it, otherwise gzip. Small bodies are sent as-is, since compressing
+them saves no round trips and still costs CPU.
+"""
+import gzip
+import threading
+import time
+from typing import Dict, Optional
+
+import zstandard
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics
+
+# server preference when the client weighs several codings equally
+ENCODINGS = ('zstd', 'gzip')
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/msgpack',
+    'application/x-msgpack',
+    'image/svg+xml',
+}
+
+_local = threading.local()
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """{coding: q} from an Accept-Encoding header"""
+    codings = {}
+    for part in header.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[name] = q
+    return codings
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    codings = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in ENCODINGS:
+        q = codings.get(coding, codings.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(';')[0].strip().lower()
+    return (media_type.startswith('text/') or media_type.endswith('+json')
+            or media_type in COMPRESSIBLE_TYPES)
+
+
+def _zstd_compressor() -> zstandard.ZstdCompressor:
+    # compressor objects are not thread-safe, so each thread keeps its own
+    compressor = getattr(_local, 'zstd', None)
+    if compressor is None:
+        compressor = _local.zstd = zstandard.ZstdCompressor(
+            level=settings.COMPRESSION_ZSTD_LEVEL)
+    return compressor
+
+
+def compress(content: bytes, encoding: str) -> bytes:
+    if encoding == 'zstd':
+        return _zstd_compressor().compress(content)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses of at least COMPRESSION_MIN_SIZE bytes. Bytes in and
+    out and CPU seconds are counted per coding in topfive.metrics, and each
+    compressed response carries a Server-Timing entry with its own numbers.
+    """
+
+    def process_response(self, request, response):
+        if (response.streaming or response.has_header('Content-Encoding')
+                or response.status_code < 200 or response.status_code in (204, 304)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+        if not _is_compressible(response.get('Content-Type', '')):
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        content = response.content
+        if len(content) < settings.COMPRESSION_MIN_SIZE:
+            metrics.incr('compression.skipped_small')
+            return response
+
+        started = time.thread_time()
+        compressed = compress(content, encoding)
+        cpu_seconds = time.thread_time() - started
+        metrics.incr(f'compression.{encoding}.cpu_seconds', cpu_seconds)
+        if len(compressed) >= len(content):
+            metrics.incr('compression.skipped_incompressible')
+            return response
+
+        metrics.incr(f'compression.{encoding}.responses')
+        metrics.incr(f'compression.{encoding}.bytes_in', len(content))
+        metrics.incr(f'compression.{encoding}.bytes_out', len(compressed))
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # the encoded bytes differ from the identity representation
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        ratio = len(content) / len(compressed)
+        timing = f'compress;dur={cpu_seconds * 1000:.2f};desc="{encoding} {ratio:.1f}x"'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+        return response
@@ -0,0 +1,26 @@
+"""
+In-process counters for the hot paths (compression, caches, ...). Each
+worker process keeps its own; scrape every worker or aggregate in the
+caller. Served to admins at /api/metrics/ (topfive.views).
+"""
+import threading
+from collections import defaultdict
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def snapshot() -> Dict[str, float]:
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
-from os import environ, path, makedirs
+from os import cpu_count, environ, path, makedirs
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -43,6 +43,13 @@ AWS_ACCESS_KEY_ID = environ['AWS_ACCESS_KEY_ID']
 AWS_SECRET_ACCESS_KEY = environ['AWS_SECRET_ACCESS_KEY']
 AWS_S3_REGION_NAME = environ['AWS_S3_REGION_NAME']
 AWS_STORAGE_BUCKET_NAME = environ['AWS_STORAGE_BUCKET_NAME']
+# e.g. a local S3 stand-in (moto, minio); unset for AWS itself
+AWS_S3_ENDPOINT_URL = environ.get('AWS_S3_ENDPOINT_URL') or None
+# lifetime of the upload URLs from get_presigned_urls, in seconds
+PRESIGNED_URL_EXPIRY = 3600
+# where clients fetch stored photos from, e.g. a CDN in front of the
+# bucket; unset to link to the bucket itself
+PHOTO_BASE_URL = environ.get('PHOTO_BASE_URL') or None
 
 # Application definition
 
@@ -62,6 +69,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'topfive.compression.CompressionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -72,6 +80,24 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+# Responses smaller than this are sent uncompressed; they fit in a packet
+# or two anyway, so compressing them only costs CPU
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_ZSTD_LEVEL = 3
+COMPRESSION_GZIP_LEVEL = 6
+
+# Serialized profile cache (users/profile_cache.py). The shared tier is the
+# default Django cache; point CACHES at a shared backend in production.
+# Other processes may serve an edited profile for up to LOCAL_TTL seconds.
+PROFILE_CACHE_TTL = 60 * 10
+PROFILE_CACHE_LOCAL_SIZE = 2048
+PROFILE_CACHE_LOCAL_TTL = 5
+# User rows for authentication and get_user_from_db (users/user_cache.py);
+# a deactivation or password change reaches other processes within LOCAL_TTL
+USER_CACHE_TTL = 60
+USER_CACHE_LOCAL_SIZE = 4096
+USER_CACHE_LOCAL_TTL = 5
+
 ROOT_URLCONF = 'topfive.urls'
 
 TEMPLATES = [
@@ -142,16 +168,64 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken', 'rest_framework_simplejwt.tokens.RefreshToken'),
+    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken', 'users.tokens.RefreshToken'),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'UPDATE_LAST_LOGIN': True,
     'JTI_CLAIM': 'jti',
+    'TOKEN_REFRESH_SERIALIZER': 'users.tokens.TokenRefreshSerializer',
+}
+# users/tokens.py: how often each process pulls new blacklist rows into its
+# filter (a blacklisting elsewhere can take this long to be seen without a
+# query), and how often the filter is rebuilt without expired tokens.
+# Expired rows themselves are removed by `manage.py compact_tokens`.
+TOKEN_BLACKLIST_SYNC_INTERVAL = 1.0
+TOKEN_BLACKLIST_REBUILD_INTERVAL = 60 * 10
+# users/hashing.py: threads hashing passwords for the async login, and how many
+# logins may wait for one before new ones are turned away with a 503
+LOGIN_HASHER_THREADS = cpu_count() or 1
+LOGIN_HASHER_MAX_PENDING = 64
+# users/photos.py: the resized copies made of every uploaded photo, by name
+# (longest side in pixels, smallest first; the first is what match lists
+# show), and the threads making them
+PHOTO_DERIVATIVE_SIZES = {
+    'thumb': 160,
+    'small': 480,
+    'large': 1080,
+}
+PHOTO_DERIVATIVE_WORKERS = cpu_count() or 1
+# users/throttling.py: token buckets for the password endpoints, as
+# (burst, refill per second), one per client IP and one per account. With
+# AUTH_THROTTLE_ADAPTIVE a request costs (hashing in flight / hasher
+# threads) IP tokens once hashing backs up, at most half the IP burst;
+# "in flight" counts this process only, so it needs threaded or async
+# workers to ever rise. Buckets live in each process unless
+# AUTH_THROTTLE_CACHE names a cache alias shared by all of them.
+AUTH_THROTTLE_RATES = {
+    'ip': (30, 0.5),
+    'account': (10, 1 / 30),
 }
+AUTH_THROTTLE_ADAPTIVE = True
+AUTH_THROTTLE_CACHE = environ.get('AUTH_THROTTLE_CACHE') or None
 
 REST_FRAMEWORK = {
+    # proxies in front of the app; client IPs (e.g. for throttling) are read
+    # from X-Forwarded-For only that far back, and from REMOTE_ADDR with none
+    'NUM_PROXIES': int(environ.get('NUM_PROXIES', 0)),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'users.authentication.CachedJWTAuthentication',
+    ),
+    # JSON stays the default; MessagePack is opt-in through Accept / Content-Type
+    'DEFAULT_RENDERER_CLASSES': (
+        'rest_framework.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'users.renderers.MessagePackRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+        'users.renderers.MessagePackParser',
+    ),
 }
 
 
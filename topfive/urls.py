@@ -21,9 +21,15 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from topfive.views import metrics_view
+from users.hashing import hashes_passwords
+from users.throttling import AuthRateThrottle
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', hashes_passwords(TokenObtainPairView.as_view(throttle_classes=[AuthRateThrottle])),
+         name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/users/', include('users.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,12 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from . import metrics
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request: Request) -> Response:
+    return Response(metrics.snapshot())
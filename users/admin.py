@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Profile, Prompt, PromptResponse, Match
+from .models import City, User, Profile, Prompt, PromptResponse, Match, Swipe, TopFive
 
 
 @admin.register(User)
@@ -57,3 +57,26 @@ class MatchAdmin(admin.ModelAdmin):
         'user2__first_name'
     )
     raw_id_fields = ('user1', 'user2')
+
+
+@admin.register(Swipe)
+class SwipeAdmin(admin.ModelAdmin):
+    list_display = ('swiper', 'swiped', 'liked', 'created_at')
+    list_filter = ('liked', 'created_at')
+    search_fields = ('swiper__email', 'swiped__email')
+    raw_id_fields = ('swiper', 'swiped')
+
+
+@admin.register(TopFive)
+class TopFiveAdmin(admin.ModelAdmin):
+    list_display = ('user', 'computed_at')
+    list_filter = ('computed_at',)
+    search_fields = ('user__email', 'user__first_name')
+    raw_id_fields = ('user',)
+
+
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'region', 'country', 'population')
+    list_filter = ('country',)
+    search_fields = ('name', 'search_name')
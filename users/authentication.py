@@ -0,0 +1,37 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .user_cache import cache_user, get_cached_user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves the token's user through users.user_cache"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            # a miss runs the stock lookup and checks
+            user = super().get_user(validated_token)
+            cache_user(user)
+            return user
+
+        if not user.is_active:
+            raise AuthenticationFailed(
+                _("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != getattr(user, 'password_claim', None):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+        return user
@@ -0,0 +1,168 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.db.models import BigIntegerField, F, Func, IntegerField, QuerySet, Value
+
+from .choices import *
+
+# Multi-valued ArrayFields stored as bitsets: bit i is set when the i-th
+# value of the field's choices is selected. Every list must stay within 63
+# values so the mask fits a signed bigint.
+MULTI_CHOICE_FIELDS: Dict[str, list] = {
+    'interests': INTEREST_CHOICES,
+    'love_languages': LOVE_LANGUAGE_CHOICES,
+    'pronouns': PRONOUN_CHOICES,
+}
+
+# Single-choice CharFields packed into Profile.choice_codes, one byte per
+# field in this order. Byte value 0 means unset, otherwise it is the value's
+# position in the field's choices plus one. Only ever append to this list
+# (and to the choice lists in choices.py), or stored codes will be misread.
+SINGLE_CHOICE_FIELDS: Dict[str, list] = {
+    'alcohol_frequency': ALCOHOL_CHOICES,
+    'body_type': BODY_TYPE_CHOICES,
+    'cannabis_friendly': CANNABIS_CHOICES,
+    'communication_style': COMMUNICATION_STYLE_CHOICES,
+    'covid_vaccine_status': VACCINE_STATUS_CHOICES,
+    'dietary_preferences': DIET_CHOICES,
+    'ethnicity': ETHNICITY_CHOICES,
+    'exercise_level': EXERCISE_CHOICES,
+    'family_plans': FAMILY_PLANS,
+    'gender': GENDER_CHOICES,
+    'highest_education': EDUCATION_CHOICES,
+    'personality_type': PERSONALITY_TYPE_CHOICES,
+    'pet_preferences': PET_CHOICES,
+    'political_views': POLITICAL_CHOICES,
+    'preferred_gender': GENDER_CHOICES,
+    'relationship_goals': RELATIONSHIP_GOAL_CHOICES,
+    'religion': RELIGION_CHOICES,
+    'sexual_orientation': SEXUAL_ORIENTATION_CHOICES,
+    'sleep_pattern': SLEEP_PATTERN_CHOICES,
+    'social_media_usage': SOCIAL_MEDIA_USAGE_CHOICES,
+    'zodiac_sign': ZODIAC_CHOICES,
+}
+CHOICE_CODES_WIDTH = len(SINGLE_CHOICE_FIELDS)
+CHOICE_CODE_OFFSETS: Dict[str, int] = {
+    field: offset for offset, field in enumerate(SINGLE_CHOICE_FIELDS)}
+
+# value -> bit and value -> code lookups, built once
+BIT_INDEX: Dict[str, Dict[str, int]] = {
+    field: {value: bit for bit, (value, _) in enumerate(choices)}
+    for field, choices in MULTI_CHOICE_FIELDS.items()
+}
+CHOICE_CODES: Dict[str, Dict[str, int]] = {
+    field: {value: code for code, (value, _) in enumerate(choices, start=1)}
+    for field, choices in SINGLE_CHOICE_FIELDS.items()
+}
+
+
+def bits_field(field: str) -> str:
+    """Name of the Profile column holding the bitset for a multi-valued field"""
+    return f'{field}_bits'
+
+
+def to_mask(field: str, values: Optional[Iterable[str]]) -> int:
+    """Encode the selected values of a multi-valued field as a bitset"""
+    index = BIT_INDEX[field]
+    mask = 0
+    for value in values or ():
+        bit = index.get(value)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def from_mask(field: str, mask: int) -> List[str]:
+    """Decode a bitset back into values, in choices order"""
+    return [value for bit, (value, _) in enumerate(MULTI_CHOICE_FIELDS[field])
+            if mask >> bit & 1]
+
+
+def to_choice_code(field: str, value: Optional[str]) -> int:
+    return CHOICE_CODES[field].get(value, 0)
+
+
+def pack_choice_codes(values: Dict[str, Optional[str]]) -> bytes:
+    """Pack single-choice values into the fixed-width choice_codes layout"""
+    return bytes(to_choice_code(field, values.get(field))
+                 for field in SINGLE_CHOICE_FIELDS)
+
+
+def unpack_choice_codes(codes: Sequence[bytes], fields: Optional[Sequence[str]] = None) -> np.ndarray:
+    """Decode many choice_codes values into an (n, len(fields)) uint8 array"""
+    width = CHOICE_CODES_WIDTH
+    packed = b''.join(bytes(code).ljust(width, b'\0')[:width]
+                      for code in codes)
+    matrix = np.frombuffer(packed, dtype=np.uint8).reshape(len(codes), width)
+    if fields is None:
+        return matrix
+    return matrix[:, [CHOICE_CODE_OFFSETS[field] for field in fields]]
+
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1')
+                           for i in range(256)], dtype=np.uint8)
+
+
+def popcount_array(masks: np.ndarray) -> np.ndarray:
+    """Vectorized popcount of an int64 array"""
+    masks = np.ascontiguousarray(masks, dtype=np.int64)
+    return _POPCOUNT_TABLE[masks.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+'''
+SQL
+'''
+
+
+class BitCount(Func):
+    """PostgreSQL (14+) popcount of a bigint expression"""
+    function = 'bit_count'
+    template = '%(function)s((%(expressions)s)::bit(64))'
+    output_field = IntegerField()
+
+
+class ChoiceCode(Func):
+    """Extract one field's code from a choice_codes column"""
+    function = 'get_byte'
+    output_field = IntegerField()
+
+    def __init__(self, codes_column: str, field: str, **extra):
+        super().__init__(F(codes_column), Value(
+            CHOICE_CODE_OFFSETS[field]), **extra)
+
+
+def shared_count(field: str, mask: int, prefix: str = '') -> BitCount:
+    """Expression counting the values shared with mask, e.g. shared interests"""
+    return BitCount(F(f'{prefix}{bits_field(field)}').bitand(
+        Value(mask, output_field=BigIntegerField())))
+
+
+def exclude_choices(queryset: QuerySet, field: str, values: Iterable[str], prefix: str = '') -> QuerySet:
+    """Drop rows whose single-choice field is one of values (a dealbreaker filter)"""
+    # unknown values encode as 0, which would drop every unset row
+    codes = [code for code in (to_choice_code(field, value) for value in values) if code]
+    if not codes:
+        return queryset
+    alias = f'_{field}_code'
+    return queryset.alias(
+        **{alias: ChoiceCode(f'{prefix}choice_codes', field)}
+    ).exclude(**{f'{alias}__in': codes})
+
+
+def exclude_any(queryset: QuerySet, field: str, values: Iterable[str], prefix: str = '') -> QuerySet:
+    """Drop rows whose multi-valued field shares any of values"""
+    mask = to_mask(field, values)
+    if not mask:
+        return queryset
+    alias = f'_{field}_hits'
+    return queryset.alias(
+        **{alias: F(f'{prefix}{bits_field(field)}').bitand(
+            Value(mask, output_field=BigIntegerField()))}
+    ).filter(**{alias: 0})
+
+
+def encode_profile_fields(values: Dict[str, object]) -> Tuple[Dict[str, int], bytes]:
+    """Return ({bits column: mask}, choice_codes) for a dict of Profile values"""
+    masks = {bits_field(field): to_mask(field, values.get(field))
+             for field in MULTI_CHOICE_FIELDS}
+    return masks, pack_choice_codes(values)
@@ -0,0 +1,73 @@
+from functools import reduce
+from operator import mul
+from typing import Iterable, List, Optional
+
+from django.db.models import BinaryField, Expression, F, Func, IntegerField, Value
+
+# 64 Kibit (8 KiB) filters with 7 hashes stay around 1% false positives up
+# to ~6800 entries. Both must stay in sync with every stored filter.
+BLOOM_BITS = 1 << 16
+BLOOM_HASHES = 7
+BLOOM_CAPACITY = 6800
+
+_MASK = BLOOM_BITS - 1
+_ID_MASK = 0xFFFFFFFF
+# odd multipliers < 2**31 so (id & _ID_MASK) * C fits a signed bigint in SQL
+_C1 = 0x7A3C5E1F
+_C2 = 0x5BD1E995
+
+
+def bit_positions(item: int) -> List[int]:
+    """
+    Double hashing over the middle bits of two multiplicative hashes. The
+    same arithmetic is done in SQL by contains_expression, so both sides must
+    change together.
+    """
+    item &= _ID_MASK
+    h1 = (item * _C1 >> 16) & _MASK
+    h2 = ((item * _C2 >> 16) & _MASK) | 1
+    return [(h1 + i * h2) & _MASK for i in range(BLOOM_HASHES)]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over integer ids, stored as raw bytes"""
+
+    def __init__(self, data: Optional[bytes] = None):
+        self.bits = bytearray(data) if data else bytearray(BLOOM_BITS // 8)
+
+    def add(self, item: int) -> bool:
+        """Add item; False when all its bits were already set"""
+        added = False
+        for pos in bit_positions(item):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            added |= not self.bits[byte] & bit
+            self.bits[byte] |= bit
+        return added
+
+    def update(self, items: Iterable[int]) -> int:
+        """Add items; returns how many of them set a new bit"""
+        return sum(self.add(item) for item in items)
+
+    def __contains__(self, item: int) -> bool:
+        return all(self.bits[pos >> 3] >> (pos & 7) & 1 for pos in bit_positions(item))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+
+class GetBit(Func):
+    """PostgreSQL get_bit(bytea, n); bit n is bit n % 8 of byte n / 8, as above"""
+    function = 'get_bit'
+    output_field = IntegerField()
+
+
+def contains_expression(data: bytes, id_field: str = 'id') -> Expression:
+    """1 when the row's id is (probably) in the filter, otherwise 0"""
+    bits = Value(bytes(data), output_field=BinaryField())
+    item = F(id_field).bitand(_ID_MASK)
+    h1 = (item * _C1).bitrightshift(16).bitand(_MASK)
+    h2 = (item * _C2).bitrightshift(16).bitand(_MASK).bitor(1)
+    return reduce(mul, [
+        GetBit(bits, (h1 + h2 * i).bitand(_MASK))
+        for i in range(BLOOM_HASHES)
+    ])
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from django.core.cache import caches
+from django.db import transaction
+
+from topfive import metrics
+
+# Stored in place of a value that was just invalidated. A reader that
+# loaded the old value before the invalidation cannot cache it while the
+# marker is there, since fills only ever add to an empty slot.
+_INVALIDATED = '__invalidated__'
+
+
+class LocalCache:
+    """Thread-safe in-process LRU with a per-entry TTL"""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._get(key)
+        return None if value is _INVALIDATED else value
+
+    def _set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def add(self, key: Hashable, value: Any) -> None:
+        """Store value unless key was invalidated within the last TTL"""
+        with self._lock:
+            if self._get(key) is not _INVALIDATED:
+                self._set(key, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._set(key, _INVALIDATED)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class TwoTierCache:
+    """
+    Read-through cache with an in-process LRU in front of a Django cache
+    backend. invalidate() removes a key from the shared tier and this
+    process's LRU. Other processes drop their copy when it expires, after
+    at most local_ttl seconds. Hits and misses per tier are counted in
+    topfive.metrics under the namespace.
+    """
+
+    def __init__(self, namespace: str, ttl: float, local_size: int, local_ttl: float,
+                 hold: float = 10, alias: str = 'default'):
+        self.namespace = namespace
+        self.ttl = ttl
+        # how long an invalidated key refuses fills, longer than a slow read
+        self.hold = hold
+        self.alias = alias
+        self.local = LocalCache(local_size, local_ttl)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _key(self, key: Hashable) -> str:
+        return f'{self.namespace}:{key}'
+
+    def get(self, key: Hashable) -> Any:
+        value = self.local.get(key)
+        if value is not None:
+            metrics.incr(f'{self.namespace}.local_hits')
+            return value
+        value = self.shared.get(self._key(key))
+        if value is None or value == _INVALIDATED:
+            metrics.incr(f'{self.namespace}.misses')
+            return None
+        metrics.incr(f'{self.namespace}.shared_hits')
+        self.local.add(key, value)
+        return value
+
+    def fill(self, key: Hashable, value: Any) -> None:
+        """Cache a value just loaded from the database, unless it was invalidated meanwhile"""
+        if self.shared.add(self._key(key), value, self.ttl):
+            self.local.add(key, value)
+
+    def _invalidate(self, key: Hashable) -> None:
+        self.shared.set(self._key(key), _INVALIDATED, self.hold)
+        self.local.invalidate(key)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._invalidate(key)
+        # and again once the write is visible to other connections, in case
+        # one of them read the old row and filled in between
+        transaction.on_commit(lambda: self._invalidate(key))
+        metrics.incr(f'{self.namespace}.invalidations')
+
+    def clear_local(self) -> None:
+        self.local.clear()
@@ -0,0 +1,36 @@
+from typing import Iterable, Optional, Set
+
+
+def _split(value: Optional[str]) -> Optional[Set[str]]:
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def parse_fieldset(query_params, allowed: Iterable[str], expandable: Iterable[str] = ()) -> Optional[Set[str]]:
+    """
+    Output keys requested with ?fields=a,b&expand=c, or None for the full
+    payload. Nested relations (expandable) are only included when named in
+    expand; everything else is picked with fields, or all of it if fields is
+    omitted. Raises ValueError for names the endpoint does not have.
+    """
+    fields = _split(query_params.get('fields'))
+    expand = _split(query_params.get('expand'))
+    if fields is None and expand is None:
+        return None
+
+    expandable = set(expandable)
+    plain = set(allowed) - expandable
+    fields = plain if fields is None else fields
+    expand = expand or set()
+
+    if fields & expandable:
+        raise ValueError(
+            f"Use expand= for: {', '.join(sorted(fields & expandable))}")
+    if fields - plain:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(fields - plain))}")
+    if expand - expandable:
+        raise ValueError(
+            f"Cannot expand: {', '.join(sorted(expand - expandable))}")
+    return fields | expand
@@ -0,0 +1,115 @@
+import math
+from typing import List, Optional, Tuple
+
+from django.db.models import Expression, F, FloatField, Q, QuerySet, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+# precision stored on Profile.geohash, ~150m x 150m cells
+GEOHASH_PRECISION = 7
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    ch = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = ch << 1 | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(_BASE32[ch])
+            bit = 0
+            ch = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell at this precision"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def _miles_per_degree_lon(latitude: float) -> float:
+    return MILES_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01)
+
+
+def covering_cells(latitude: float, longitude: float, radius_miles: float) -> Optional[List[str]]:
+    """
+    Geohash prefixes whose cells together cover the circle: the cell holding
+    the point plus its eight neighbours, at the finest precision whose cells
+    are still at least `radius_miles` across. None if the radius is so large
+    that no prefix narrows the search.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size_degrees(precision)
+        if (height * MILES_PER_DEGREE_LAT >= radius_miles and
+                width * _miles_per_degree_lon(latitude) >= radius_miles):
+            break
+    else:
+        return None
+
+    cells = set()
+    for dlat in (-height, 0.0, height):
+        lat = latitude + dlat
+        if not -90.0 <= lat <= 90.0:
+            continue
+        for dlon in (-width, 0.0, width):
+            lon = (longitude + dlon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return sorted(cells)
+
+
+def distance_expression(latitude: float, longitude: float, prefix: str = '') -> Expression:
+    """Haversine distance in miles from a point to each row's coordinates"""
+    lat1 = Radians(Value(latitude, output_field=FloatField()))
+    lat2 = Radians(F(f'{prefix}latitude'))
+    dlat = Radians(F(f'{prefix}latitude') - latitude)
+    dlon = Radians(F(f'{prefix}longitude') - longitude)
+    a = Power(Sin(dlat / 2), 2) + Cos(lat1) * Cos(lat2) * Power(Sin(dlon / 2), 2)
+    # Least() guards asin against rounding just above 1 for antipodal points
+    return 2 * EARTH_RADIUS_MILES * ASin(Least(Sqrt(a), Value(1.0)))
+
+
+def within_radius(queryset: QuerySet, latitude: float, longitude: float, radius_miles: float,
+                  prefix: str = '') -> QuerySet:
+    """
+    Narrow a queryset to rows within radius_miles of a point. The geohash
+    prefixes and bounding box are index-friendly coarse filters; the exact
+    distance is then checked on what is left. Rows keep a `distance` alias
+    for further filtering.
+    """
+    cells = covering_cells(latitude, longitude, radius_miles)
+    if cells:
+        cell_filter = Q()
+        for cell in cells:
+            cell_filter |= Q(**{f'{prefix}geohash__startswith': cell})
+        queryset = queryset.filter(cell_filter)
+
+    dlat = radius_miles / MILES_PER_DEGREE_LAT
+    queryset = queryset.filter(**{
+        f'{prefix}latitude__range': (latitude - dlat, latitude + dlat),
+    })
+    dlon = radius_miles / _miles_per_degree_lon(latitude)
+    if -180.0 <= longitude - dlon and longitude + dlon <= 180.0:
+        queryset = queryset.filter(**{
+            f'{prefix}longitude__range': (longitude - dlon, longitude + dlon),
+        })
+    return queryset.alias(
+        distance=distance_expression(latitude, longitude, prefix)
+    ).filter(distance__lte=radius_miles)
@@ -0,0 +1,77 @@
+"""
+Where this process hashes passwords, and how much of it is in flight:
+HasherPool for the async login, hashes_passwords for the sync views.
+hashing_depth() drives the adaptive auth throttle.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Callable
+
+from django.conf import settings
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class HasherPool:
+    """
+    Thread pool for password hashing with a cap on queued work. Beyond
+    max_pending, run() fails fast instead of queueing requests that would
+    time out anyway. depth() is how much hashing is waiting or running.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hasher')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def depth(self) -> int:
+        return self._pending
+
+    async def run(self, fn: Callable, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HasherBusy()
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+hasher_pool = HasherPool(settings.LOGIN_HASHER_THREADS,
+                         settings.LOGIN_HASHER_MAX_PENDING)
+
+
+_hashing_lock = threading.Lock()
+_hashing_in_views = 0
+
+
+def hashes_passwords(view):
+    """Count a sync view's requests in hashing_depth() while they run"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        global _hashing_in_views
+        with _hashing_lock:
+            _hashing_in_views += 1
+        try:
+            return view(*args, **kwargs)
+        finally:
+            with _hashing_lock:
+                _hashing_in_views -= 1
+    return wrapper
+
+
+def hashing_depth() -> int:
+    """
+    Password hashing running or waiting in this process. Only this
+    process: under sync, single-threaded workers it never exceeds 1, so
+    the adaptive throttle only tightens with threaded or async workers.
+    """
+    return _hashing_in_views + hasher_pool.depth()
@@ -0,0 +1,56 @@
+from typing import Optional
+
+from django.http import HttpResponse
+from django.utils.http import parse_etags, quote_etag
+
+# How long clients and shared caches may reuse a response that can only
+# change on deploy, e.g. the profile choices
+STATIC_MAX_AGE = 60 * 60 * 24
+# ...and one requested under its own content version, which never changes
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def make_etag(version: object) -> str:
+    """Strong ETag header value for a version or content hash"""
+    return quote_etag(str(version))
+
+
+def _strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def if_none_match(request, etag: str) -> bool:
+    """
+    True when If-None-Match lists etag (or *), i.e. the client's copy is
+    current and a 304 can be sent. Uses the weak comparison, as RFC 9110
+    requires for If-None-Match.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or _strip_weak(etag) in {_strip_weak(e) for e in etags}
+
+
+def if_match_fails(request, etag: Optional[str]) -> bool:
+    """
+    True when an If-Match precondition is present and does not hold for etag,
+    i.e. the client is writing over a version it has not seen. etag None
+    means the resource does not exist. A W/ prefix is ignored: our tags name
+    versions, and the compression middleware weakens them in transit.
+    """
+    header = request.headers.get('If-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if '*' in etags:
+        return etag is None
+    return etag is None or _strip_weak(etag) not in {_strip_weak(e) for e in etags}
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> HttpResponse:
+    response = HttpResponse(status=304)
+    response['ETag'] = etag
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    return response
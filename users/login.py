@@ -0,0 +1,162 @@
+"""
+Stateless JWT login for API clients: no session, password hashing on a
+bounded thread pool off the event loop, and the token/last_login writes
+batched in the background. Served by token_login, an async view, so run
+the app under an ASGI server (topfive/asgi.py) to get the benefit.
+"""
+import atexit
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import close_old_connections
+from django.http import HttpRequest, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from .hashing import HasherBusy, hasher_pool
+from .models import User
+from .serializers import UserSerializer
+from .throttling import client_ip, throttle_wait
+from .tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+LOGIN_BOOKKEEPING_BUFFER_SIZE = 500
+LOGIN_BOOKKEEPING_FLUSH_INTERVAL = 1.0
+
+
+class LoginBookkeeping:
+    """
+    Per-process buffer of the writes a login implies: the refresh token's
+    OutstandingToken row and the user's last_login. Flushed in bulk by size,
+    by age (from a background thread) and at exit. The outstanding rows only
+    feed blacklisting, which creates a missing row itself, so losing a
+    buffer with the process costs nothing but last_login stamps.
+    """
+
+    def __init__(self, max_size: int = LOGIN_BOOKKEEPING_BUFFER_SIZE,
+                 flush_interval: float = LOGIN_BOOKKEEPING_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._outstanding: List[OutstandingToken] = []
+        self._last_login: Dict[int, datetime] = {}
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, outstanding: OutstandingToken, user_id: int, logged_in_at: datetime = None) -> None:
+        with self._lock:
+            self._outstanding.append(outstanding)
+            if logged_in_at is not None:
+                self._last_login[user_id] = logged_in_at
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._outstanding) >= self.max_size
+            self._ensure_flusher()
+        if full:
+            # off the event loop; flush() blocks on the database
+            threading.Thread(target=self._flush_in_thread, daemon=True).start()
+
+    def flush(self) -> int:
+        with self._lock:
+            outstanding, self._outstanding = self._outstanding, []
+            last_login, self._last_login = self._last_login, {}
+            self._oldest = None
+        if outstanding:
+            OutstandingToken.objects.bulk_create(outstanding, ignore_conflicts=True)
+        if last_login:
+            User.objects.bulk_update(
+                [User(pk=user_id, last_login=logged_in_at)
+                 for user_id, logged_in_at in last_login.items()],
+                ['last_login'])
+        return len(outstanding)
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing login bookkeeping: {str(e)}")
+        finally:
+            close_old_connections()
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name='login-bookkeeping', daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval / 2)
+            with self._lock:
+                due = self._oldest is not None and \
+                    time.monotonic() - self._oldest >= self.flush_interval
+            if due:
+                self._flush_in_thread()
+
+
+login_bookkeeping = LoginBookkeeping()
+atexit.register(login_bookkeeping.flush)
+
+
+def _verify(user: User, password: str) -> bool:
+    if user is None or not user.is_active:
+        # hash anyway, so unknown emails take as long as wrong passwords
+        make_password(password)
+        return False
+    return check_password(password, user.password)
+
+
+@csrf_exempt
+@require_POST
+async def token_login(request: HttpRequest) -> JsonResponse:
+    try:
+        data = json.loads(request.body)
+        email, password = data['email'].lower(), data['password']
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid request body'}, status=400)
+    except KeyError as e:
+        return JsonResponse({'error': f'Missing required field: {str(e)}'}, status=400)
+
+    # the buckets may live in a shared cache, a network round trip
+    wait = await sync_to_async(throttle_wait)(client_ip(request), email)
+    if wait:
+        response = JsonResponse({'error': 'Too many attempts, try again later'}, status=429)
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+
+    try:
+        user = await User.objects.filter(email=email).afirst()
+        if not await hasher_pool.run(_verify, user, password):
+            return JsonResponse({'error': 'Invalid credentials'}, status=401)
+
+        refresh, outstanding = RefreshToken.for_user_unrecorded(user)
+        login_bookkeeping.add(
+            outstanding, user.pk,
+            timezone.now() if api_settings.UPDATE_LAST_LOGIN else None)
+        return JsonResponse({
+            'user': UserSerializer(user).data,
+            'tokens': {
+                'refresh': str(refresh),
+                'access': str(refresh.access_token),
+            }
+        })
+    except HasherBusy:
+        response = JsonResponse({'error': 'Too many logins in progress, try again shortly'},
+                                status=503)
+        response['Retry-After'] = '1'
+        return response
+    except Exception as e:
+        logger.error(f"Error in token_login: {str(e)}")
+        return JsonResponse({'error': 'An unexpected error occurred'}, status=500)
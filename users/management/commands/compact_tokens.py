@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = ('Delete expired outstanding tokens and their blacklist entries in small '
+            'batches, walking the primary key so no batch scans or locks the whole table')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        last_id = 0
+        deleted = blacklisted = 0
+        while True:
+            ids = list(OutstandingToken.objects.filter(
+                id__gt=last_id, expires_at__lte=now
+            ).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                blacklisted += BlacklistedToken.objects.filter(
+                    token_id__in=ids).delete()[0]
+                deleted += OutstandingToken.objects.filter(
+                    id__in=ids).delete()[0]
+            last_id = ids[-1]
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired tokens ({blacklisted} blacklisted)'))
@@ -0,0 +1,61 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import os
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from users.models import User
+from users.top_five import compute_chunk, save_picks
+
+
+def _init_worker():
+    # Workers must not reuse the parent's database connections
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Precompute every active user's top five picks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--active-days', type=int, default=30,
+            help='Only users who logged in this many days ago or later; 0 for everyone')
+        parser.add_argument(
+            '--changed-only', action='store_true',
+            help='Only users without picks or whose profile changed since their last run')
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+        users = User.objects.filter(is_active=True, profile__isnull=False)
+        if options['active_days']:
+            users = users.filter(
+                last_login__gte=started_at - timedelta(days=options['active_days']))
+        if options['changed_only']:
+            users = users.filter(
+                Q(top_five__isnull=True) |
+                Q(profile__updated_at__gt=F('top_five__computed_at')))
+
+        user_ids = list(users.order_by('id').values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        chunks = [user_ids[i:i + chunk_size]
+                  for i in range(0, len(user_ids), chunk_size)]
+
+        # Close our connections before forking so no worker inherits them
+        connections.close_all()
+        computed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(compute_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                results = future.result()
+                save_picks(results, computed_at=started_at)
+                computed += len(results)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed top five for {computed} users'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from users.models import ENCODED_FIELDS, Profile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the bitset/choice code encodings of every profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        updated = 0
+        for profile in Profile.objects.order_by('id').iterator(chunk_size=batch_size):
+            profile.sync_encodings()
+            batch.append(profile)
+            if len(batch) == batch_size:
+                Profile.objects.bulk_update(batch, ENCODED_FIELDS)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Profile.objects.bulk_update(batch, ENCODED_FIELDS)
+            updated += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Encoded {updated} profiles'))
@@ -0,0 +1,50 @@
+import csv
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import City
+
+# Column positions in a GeoNames cities dump (e.g. cities15000.txt)
+NAME, ASCII_NAME, LATITUDE, LONGITUDE, COUNTRY, REGION, POPULATION = 1, 2, 4, 5, 8, 10, 14
+
+
+class Command(BaseCommand):
+    help = 'Load the offline City table from a GeoNames cities dump'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a GeoNames citiesNNNN.txt file')
+        parser.add_argument('--country', action='append',
+                            help='Only load these ISO country codes (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete existing cities first')
+
+    def handle(self, *args, **options):
+        countries = {code.upper() for code in options['country'] or ()}
+        batch_size = options['batch_size']
+        loaded = 0
+        with transaction.atomic(), open(options['path'], encoding='utf-8', newline='') as dump:
+            if options['replace']:
+                City.objects.all().delete()
+            batch = []
+            for row in csv.reader(dump, delimiter='\t', quoting=csv.QUOTE_NONE):
+                if countries and row[COUNTRY] not in countries:
+                    continue
+                batch.append(City(
+                    name=row[NAME],
+                    search_name=City.normalize(row[ASCII_NAME] or row[NAME]),
+                    region=row[REGION],
+                    country=row[COUNTRY],
+                    latitude=float(row[LATITUDE]),
+                    longitude=float(row[LONGITUDE]),
+                    population=int(row[POPULATION] or 0),
+                ))
+                if len(batch) == batch_size:
+                    City.objects.bulk_create(batch)
+                    loaded += len(batch)
+                    batch = []
+            City.objects.bulk_create(batch)
+            loaded += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} cities'))
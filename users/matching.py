@@ -0,0 +1,118 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.db.models import Exists, F, OuterRef, Q, QuerySet
+from .bitsets import (BIT_INDEX, CHOICE_CODES, MULTI_CHOICE_FIELDS, exclude_any, exclude_choices,
+                      shared_count)
+from .geo import distance_expression, within_radius
+from .models import MatchEdge, User
+from .seen import exclude_seen
+
+
+def years_before(day: date, years: int) -> date:
+    """The same calendar day `years` years earlier (Feb 29 falls back to Feb 28)"""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+def age_on(birthdate: date, day: date) -> int:
+    return day.year - birthdate.year - ((day.month, day.day) < (birthdate.month, birthdate.day))
+
+
+DEALBREAKER_PREFIX = 'exclude_'
+
+
+def parse_candidate_filters(query_params) -> Tuple[int, Dict[str, List[str]]]:
+    """
+    (min_shared_interests, dealbreakers) from e.g.
+    ?min_shared_interests=2&exclude_religion=islam,judaism&exclude_interests=gaming.
+    Raises ValueError for unknown fields or values.
+    """
+    try:
+        min_shared = int(query_params.get('min_shared_interests') or 0)
+    except ValueError:
+        raise ValueError('Invalid min_shared_interests')
+    if min_shared < 0:
+        raise ValueError('Invalid min_shared_interests')
+
+    dealbreakers = {}
+    for name in query_params:
+        if not name.startswith(DEALBREAKER_PREFIX):
+            continue
+        field = name[len(DEALBREAKER_PREFIX):]
+        known = BIT_INDEX.get(field) or CHOICE_CODES.get(field)
+        if known is None:
+            raise ValueError(f'Unknown dealbreaker field: {field}')
+        values = [value.strip() for value in query_params.get(name).split(',') if value.strip()]
+        unknown = [value for value in values if value not in known]
+        if unknown:
+            raise ValueError(f"Unknown {field} values: {', '.join(unknown)}")
+        dealbreakers[field] = values
+    return min_shared, dealbreakers
+
+
+def get_candidate_users(user: User, min_shared_interests: int = 0,
+                        dealbreakers: Optional[Dict[str, Iterable[str]]] = None) -> QuerySet:
+    """
+    Users who fit the requester's gender, age and distance preferences and
+    whose own preferences accept the requester, minus existing matches and
+    users already seen, ordered by id. Optionally only those sharing at
+    least min_shared_interests interests, and without any of the
+    dealbreakers ({field: values}); both are bitset tests in SQL.
+    """
+    user_profile = user.profile
+    min_age = user_profile.min_preferred_age
+    max_age = user_profile.max_preferred_age
+    preferred_gender = user_profile.preferred_gender
+
+    today = date.today()
+    min_birth_date = years_before(today, max_age)
+    max_birth_date = years_before(today, min_age)
+
+    # Both sides of the preference check run in the same query, backed by the
+    # (gender, preferred_gender) index on Profile and the birthdate index on User
+    candidates = User.objects.filter(
+        profile__gender=preferred_gender,
+        profile__preferred_gender=user_profile.gender,
+        birthdate__gte=min_birth_date,
+        birthdate__lte=max_birth_date
+    ).exclude(id=user.id)
+    if user.birthdate:
+        requester_age = age_on(user.birthdate, today)
+        candidates = candidates.filter(
+            profile__min_preferred_age__lte=requester_age,
+            profile__max_preferred_age__gte=requester_age
+        )
+
+    if user_profile.latitude is not None and user_profile.longitude is not None:
+        if user_profile.max_distance is not None:
+            candidates = within_radius(
+                candidates, user_profile.latitude, user_profile.longitude,
+                user_profile.max_distance, prefix='profile__')
+        else:
+            candidates = candidates.alias(distance=distance_expression(
+                user_profile.latitude, user_profile.longitude, prefix='profile__'))
+        # and the candidate's own distance limit must reach the requester
+        candidates = candidates.filter(
+            Q(profile__max_distance__isnull=True) |
+            Q(profile__max_distance__gte=F('distance')))
+
+    if min_shared_interests:
+        candidates = candidates.alias(_shared_interests=shared_count(
+            'interests', user_profile.interests_bits, prefix='profile__')
+        ).filter(_shared_interests__gte=min_shared_interests)
+    for field, values in (dealbreakers or {}).items():
+        exclude = exclude_any if field in MULTI_CHOICE_FIELDS else exclude_choices
+        candidates = exclude(candidates, field, values, prefix='profile__')
+
+    # Exclude users who are already matches, and anyone already seen
+    candidates = candidates.exclude(Exists(MatchEdge.objects.filter(
+        user=user, other=OuterRef('pk'))))
+    candidates = exclude_seen(candidates, user.id)
+    return candidates.order_by('id')
+
+
+def explain_candidate_query(user: User, **options) -> str:
+    """The database's query plan for get_candidate_users, e.g. for tests"""
+    return get_candidate_users(user).explain(**options)
@@ -0,0 +1,186 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:57
+#
+# The tree had no migrations before 0002_canonical_matches, so this one
+# also holds the model changes made alongside it: the profile choice
+# bitsets and codes, TopFive and Profile.updated_at, the candidate-filter
+# indexes, the geohash column, the seen filter and the Swipe table.
+
+import django.contrib.auth.validators
+import django.contrib.postgres.fields
+import django.db.models.deletion
+import django.utils.timezone
+import users.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('birthdate', models.DateField(blank=True, db_index=True, null=True)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('search_name', models.CharField(db_index=True, max_length=200)),
+                ('region', models.CharField(blank=True, max_length=20)),
+                ('country', models.CharField(max_length=2)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('population', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Prompt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(default=True)),
+                ('text', models.CharField(max_length=250)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SeenFilter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seen_filter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('bits', models.BinaryField(default=users.models.empty_seen_filter)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TopFive',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='top_five', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('picks', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Match',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matched_at', models.DateTimeField(auto_now_add=True)),
+                ('user1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match1', to=settings.AUTH_USER_MODEL)),
+                ('user2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match2', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alcohol_frequency', models.CharField(choices=[('never', 'Never'), ('rarely', 'Rarely'), ('socially', 'Socially'), ('regularly', 'Regularly'), ('prefer_not_to_say', 'Prefer not to say')], default='prefer_not_to_say', max_length=20)),
+                ('bio', models.TextField(blank=True)),
+                ('body_type', models.CharField(choices=[('athletic', 'Athletic'), ('muscular', 'Muscular'), ('average', 'Average'), ('slim', 'Slim'), ('curvy', 'Curvy'), ('plus_size', 'Plus Size'), ('prefer_not_to_say', 'Prefer not to say')], default='prefer_not_to_say', max_length=20)),
+                ('cannabis_friendly', models.CharField(choices=[('never', 'Never'), ('occasionally', 'Occasionally'), ('regularly', 'Regularly'), ('prefer_not_to_say', 'Prefer not to say')], default='prefer_not_to_say', max_length=20)),
+                ('communication_style', models.CharField(choices=[('in_person', 'In Person'), ('phone_calls', 'Phone Calls'), ('video_calls', 'Video Calls'), ('texting', 'Texting'), ('mixed', 'Mix of Everything')], default='mixed', max_length=15)),
+                ('company', models.CharField(blank=True, max_length=100, null=True)),
+                ('covid_vaccine_status', models.CharField(choices=[('vaccinated', 'Vaccinated'), ('not_vaccinated', 'Not Vaccinated'), ('prefer_not_to_say', 'Prefer not to say')], default='prefer_not_to_say', max_length=20)),
+                ('dietary_preferences', models.CharField(choices=[('omnivore', 'Omnivore'), ('vegetarian', 'Vegetarian'), ('vegan', 'Vegan'), ('pescatarian', 'Pescatarian'), ('keto', 'Keto'), ('gluten_free', 'Gluten-Free'), ('kosher', 'Kosher'), ('halal', 'Halal'), ('other', 'Other')], default='omnivore', max_length=15)),
+                ('family_plans', models.CharField(choices=[('no_children', "I don't have children"), ('have_and_want_more', 'I have children and want more'), ('have_and_dont_want_more', "I have children and don't want more"), ('want_children', 'I want children'), ('cannot_have_children', 'I cannot have children'), ('dont_want_children', "I don't want children"), ('undecided', "I'm undecided about having children")], default='undecided', max_length=40)),
+                ('ethnicity', models.CharField(choices=[('asian', 'Asian'), ('black', 'Black/African'), ('hispanic', 'Hispanic/Latino'), ('middle_eastern', 'Middle Eastern'), ('native_american', 'Native American'), ('pacific_islander', 'Pacific Islander'), ('white', 'White/Caucasian'), ('multiracial', 'Multiracial'), ('other', 'Other')], default='prefer_not_to_say', max_length=20)),
+                ('exercise_level', models.CharField(blank=True, choices=[('daily', 'Daily'), ('often', 'Often'), ('sometimes', 'Sometimes'), ('rarely', 'Rarely'), ('never', 'Never')], max_length=10, null=True)),
+                ('gender', models.CharField(choices=[('male', 'Male'), ('female', 'Female'), ('non-binary', 'Non-Binary')], max_length=10)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('highest_education', models.CharField(blank=True, choices=[('high_school', 'High School'), ('trade_school', 'Trade School'), ('associate', 'Associate Degree'), ('bachelor', "Bachelor's Degree"), ('master', "Master's Degree"), ('doctorate', 'Doctorate'), ('other', 'Other')], max_length=18, null=True)),
+                ('interests', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(choices=[('art_culture', 'Art & Culture'), ('books', 'Reading & Books'), ('travel', 'Travel & Adventure'), ('cooking', 'Cooking & Food'), ('dance', 'Dancing'), ('fashion', 'Fashion'), ('fitness', 'Fitness & Health'), ('gaming', 'Gaming'), ('gardening', 'Gardening'), ('hiking', 'Hiking'), ('movies', 'Movies & TV'), ('music', 'Music'), ('pets', 'Pets & Animals'), ('photography', 'Photography'), ('sports', 'Sports'), ('tech', 'Technology'), ('writing', 'Writing')], max_length=20), blank=True, default=list, size=None)),
+                ('job_title', models.CharField(blank=True, max_length=100, null=True)),
+                ('life_goals', models.TextField(blank=True, null=True)),
+                ('location', models.CharField(max_length=100)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('geohash', models.CharField(blank=True, db_index=True, editable=False, max_length=7)),
+                ('love_languages', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(choices=[('words', 'Words of Affirmation'), ('acts', 'Acts of Service'), ('gifts', 'Receiving Gifts'), ('time', 'Quality Time'), ('touch', 'Physical Touch')], max_length=20), blank=True, default=list, size=None)),
+                ('max_distance', models.PositiveIntegerField(blank=True, help_text='Maximum match distance in miles, empty for no limit', null=True)),
+                ('max_preferred_age', models.IntegerField(default=99)),
+                ('min_preferred_age', models.IntegerField(default=18)),
+                ('personality_type', models.CharField(choices=[('INTJ', 'INTJ'), ('INTP', 'INTP'), ('ENTJ', 'ENTJ'), ('ENTP', 'ENTP'), ('INFJ', 'INFJ'), ('INFP', 'INFP'), ('ENFJ', 'ENFJ'), ('ENFP', 'ENFP'), ('ISTJ', 'ISTJ'), ('ISFJ', 'ISFJ'), ('ESTJ', 'ESTJ'), ('ESFJ', 'ESFJ'), ('ISTP', 'ISTP'), ('ISFP', 'ISFP'), ('ESTP', 'ESTP'), ('ESFP', 'ESFP'), ('unknown', "Don't Know")], default='unknown', max_length=10)),
+                ('pet_preferences', models.CharField(choices=[('dogs', 'Dogs'), ('cats', 'Cats'), ('birds', 'Birds'), ('fish', 'Fish'), ('reptiles', 'Reptiles'), ('small_animals', 'Small Animals'), ('multiple', 'Multiple Types'), ('none', 'None'), ('allergic', 'Allergic'), ('dislike', 'Dislike')], default='none', max_length=15)),
+                ('phone_number', models.CharField(blank=True, max_length=15, null=True)),
+                ('picture_urls', django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, size=None)),
+                ('political_views', models.CharField(blank=True, choices=[('liberal', 'Liberal'), ('moderate', 'Moderate'), ('conservative', 'Conservative'), ('apolitical', 'Apolitical'), ('other', 'Other')], max_length=12, null=True)),
+                ('preferred_gender', models.CharField(blank=True, choices=[('male', 'Male'), ('female', 'Female'), ('non-binary', 'Non-Binary')], max_length=10, null=True)),
+                ('pronouns', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(choices=[('he_him', 'He/Him'), ('she_her', 'She/Her'), ('they_them', 'They/Them'), ('he_they', 'He/They'), ('she_they', 'She/They'), ('ze_zir', 'Ze/Zir'), ('ze_hir', 'Ze/Hir'), ('xe_xem', 'Xe/Xem'), ('any', 'Any Pronouns'), ('other', 'Other'), ('prefer_not_to_say', 'Prefer not to say')], max_length=20), blank=True, default=list, help_text="User's preferred pronouns (can select multiple)", size=None)),
+                ('relationship_goals', models.CharField(choices=[('long_term', 'Long-term Relationship'), ('short_term', 'Short-term Relationship'), ('short_open_to_long', 'Short-term, Open to Long-term'), ('casual', 'Casual Dating'), ('friends', 'Friends First'), ('not_sure', 'Not Sure Yet')], default='not_sure', max_length=20)),
+                ('religion', models.CharField(choices=[('christianity', 'Christianity'), ('islam', 'Islam'), ('judaism', 'Judaism'), ('hinduism', 'Hinduism'), ('buddhism', 'Buddhism'), ('sikhism', 'Sikhism'), ('spiritual', 'Spiritual but not religious'), ('agnostic', 'Agnostic'), ('atheist', 'Atheist'), ('other', 'Other'), ('prefer_not_to_say', 'Prefer not to say')], default='prefer_not_to_say', max_length=20)),
+                ('sexual_orientation', models.CharField(choices=[('straight', 'Straight/Heterosexual'), ('gay', 'Gay'), ('lesbian', 'Lesbian'), ('bisexual', 'Bisexual'), ('pansexual', 'Pansexual'), ('demisexual', 'Demisexual'), ('questioning', 'Questioning'), ('asexual', 'Asexual'), ('queer', 'Queer'), ('other', 'Other')], default='prefer_not_to_say', max_length=20)),
+                ('sleep_pattern', models.CharField(choices=[('early_bird', 'Early Bird'), ('night_owl', 'Night Owl'), ('regular', 'Regular Schedule'), ('irregular', 'Irregular Schedule')], default='regular', max_length=15)),
+                ('social_media_usage', models.CharField(choices=[('very_active', 'Very Active'), ('moderate', 'Moderate'), ('minimal', 'Minimal'), ('none', 'No Social Media')], default='moderate', max_length=15)),
+                ('special_talents', models.TextField(blank=True, null=True)),
+                ('zodiac_sign', models.CharField(blank=True, choices=[('aries', 'Aries'), ('taurus', 'Taurus'), ('gemini', 'Gemini'), ('cancer', 'Cancer'), ('leo', 'Leo'), ('virgo', 'Virgo'), ('libra', 'Libra'), ('scorpio', 'Scorpio'), ('sagittarius', 'Sagittarius'), ('capricorn', 'Capricorn'), ('aquarius', 'Aquarius'), ('pisces', 'Pisces')], max_length=15, null=True)),
+                ('interests_bits', models.BigIntegerField(default=0, editable=False)),
+                ('love_languages_bits', models.BigIntegerField(default=0, editable=False)),
+                ('pronouns_bits', models.BigIntegerField(default=0, editable=False)),
+                ('choice_codes', models.BinaryField(default=b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', max_length=21)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PromptResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('response', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.profile')),
+                ('prompt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='users.prompt')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='prompts',
+            field=models.ManyToManyField(through='users.PromptResponse', to='users.prompt'),
+        ),
+        migrations.CreateModel(
+            name='Swipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('liked', models.BooleanField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('swiped', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swipes_received', to=settings.AUTH_USER_MODEL)),
+                ('swiper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='swipes_made', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='promptresponse',
+            constraint=models.UniqueConstraint(fields=('profile', 'prompt'), name='unique_profile_prompt'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['gender', 'preferred_gender'], name='profile_gender_pref_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='swipe',
+            constraint=models.UniqueConstraint(fields=('swiper', 'swiped'), name='unique_swipe'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.0.7 on 2026-10-18 15:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Store every pair as user1 < user2, drop self-matches, then keep only the
+# oldest row of each pair so the new constraints can be added. The foreign
+# keys are deferred, so their checks are made immediate first: Postgres won't
+# ALTER a table with pending trigger events in the same transaction.
+CANONICALIZE_MATCHES = """
+SET CONSTRAINTS ALL IMMEDIATE;
+
+UPDATE users_match SET user1_id = user2_id, user2_id = user1_id
+WHERE user1_id > user2_id;
+
+DELETE FROM users_match WHERE user1_id = user2_id;
+
+DELETE FROM users_match AS duplicate
+USING users_match AS kept
+WHERE duplicate.user1_id = kept.user1_id
+  AND duplicate.user2_id = kept.user2_id
+  AND (duplicate.matched_at, duplicate.id) > (kept.matched_at, kept.id);
+"""
+
+BACKFILL_MATCH_EDGES = """
+INSERT INTO users_matchedge (user_id, other_id, match_id, matched_at)
+SELECT user1_id, user2_id, id, matched_at FROM users_match
+UNION ALL
+SELECT user2_id, user1_id, id, matched_at FROM users_match;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matched_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunSQL(CANONICALIZE_MATCHES, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='match',
+            constraint=models.UniqueConstraint(fields=('user1', 'user2'), name='unique_match_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='match',
+            constraint=models.CheckConstraint(check=models.Q(('user1__lt', models.F('user2'))), name='match_pair_ordered'),
+        ),
+        migrations.AddField(
+            model_name='matchedge',
+            name='match',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='users.match'),
+        ),
+        migrations.AddField(
+            model_name='matchedge',
+            name='other',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='matchedge',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_edges', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='matchedge',
+            index=models.Index(fields=['user', '-matched_at'], name='match_edge_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='matchedge',
+            constraint=models.UniqueConstraint(fields=('user', 'other'), name='unique_match_edge'),
+        ),
+        migrations.RunSQL(BACKFILL_MATCH_EDGES, migrations.RunSQL.noop),
+    ]
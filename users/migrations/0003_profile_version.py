@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_canonical_matches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='version',
+            field=models.PositiveBigIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_profile_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='photo_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,67 @@
+import re
+from urllib.parse import unquote, urlsplit
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def _key(url):
+    """The object key in a photo URL: the path from the user_<id>/ segment on"""
+    path = unquote(urlsplit(url).path)
+    start = path.find('/user_')
+    return path[start + 1:] if start != -1 else path.lstrip('/')
+
+
+def build_manifests(apps, schema_editor):
+    Profile = apps.get_model('users', 'Profile')
+    profiles = Profile.objects.exclude(picture_urls=[]).only(
+        'id', 'picture_urls', 'photo_derivatives').iterator(chunk_size=BATCH_SIZE)
+    batch = []
+    for profile in profiles:
+        photos = {}
+        for position, url in enumerate(profile.picture_urls):
+            match = re.search(r'photo_(\d+)\.[^/]+$', urlsplit(url).path)
+            slot = match.group(1) if match else str(position)
+            photos[slot] = {
+                'key': _key(url),
+                'hash': None,
+                'width': None,
+                'height': None,
+                'derivatives': {size: _key(derivative) for size, derivative
+                                in profile.photo_derivatives.get(slot, {}).items()},
+            }
+        profile.photos = photos
+        # without the ?t= the old clean() added on every save
+        profile.picture_urls = [url.split('?')[0] for url in profile.picture_urls]
+        batch.append(profile)
+        if len(batch) == BATCH_SIZE:
+            Profile.objects.bulk_update(batch, ['photos', 'picture_urls'])
+            batch = []
+    Profile.objects.bulk_update(batch, ['photos', 'picture_urls'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_photo_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='photos',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(build_manifests, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='profile',
+            name='photo_derivatives',
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='picture_urls',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), blank=True, default=list, editable=False, size=None),
+        ),
+    ]
@@ -1,9 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser, PermissionsMixin, BaseUserManager
 from django.contrib.postgres.fields import ArrayField
 from django.forms import ValidationError
 from datetime import datetime, timedelta
 from .choices import *
+from .geo import GEOHASH_PRECISION, encode_geohash
+from . import photo_manifest
+from .photo_manifest import MAX_PHOTOS
+from .bloom import BLOOM_BITS
+from .bitsets import CHOICE_CODES_WIDTH, MULTI_CHOICE_FIELDS, SINGLE_CHOICE_FIELDS, encode_profile_fields
 
 
 class Prompt(models.Model):
@@ -14,6 +20,35 @@ class Prompt(models.Model):
         return self.text
 
 
+class City(models.Model):
+    """Offline gazetteer used to place free-text profile locations, see load_cities"""
+    name = models.CharField(max_length=200)
+    search_name = models.CharField(max_length=200, db_index=True)
+    region = models.CharField(max_length=20, blank=True)
+    country = models.CharField(max_length=2)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    population = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}, {self.region}" if self.region else self.name
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return ' '.join(name.lower().replace('.', '').split())
+
+    @classmethod
+    def lookup(cls, location: str):
+        """Best city for a "City" or "City, Region" string, or None"""
+        name, _, region = (part.strip() for part in location.partition(','))
+        if not name:
+            return None
+        cities = cls.objects.filter(search_name=cls.normalize(name))
+        if region:
+            cities = cities.filter(region__iexact=region)
+        return cities.order_by('-population').first()
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password, **extra_fields):
         if not email:
@@ -27,7 +62,7 @@ class UserManager(BaseUserManager):
 
 
 class User(AbstractUser, PermissionsMixin):
-    birthdate = models.DateField(blank=True, null=True)
+    birthdate = models.DateField(blank=True, null=True, db_index=True)
     email = models.EmailField(unique=True)
 
     USERNAME_FIELD = 'email'
@@ -38,6 +73,20 @@ class User(AbstractUser, PermissionsMixin):
     def __str__(self):
         return self.get_full_name()
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if not adding and (update_fields is None or set(update_fields) & set(PROFILE_USER_FIELDS)):
+            Profile.bump_version(user_id=self.pk)
+
+
+ENCODED_FIELDS = ('interests_bits', 'love_languages_bits',
+                  'pronouns_bits', 'choice_codes')
+LOCATION_FIELDS = ('latitude', 'longitude', 'geohash')
+# User columns included in serialized profiles (ProfileSerializer.user_details)
+PROFILE_USER_FIELDS = ('email', 'first_name', 'last_name', 'birthdate')
+
 
 class Profile(models.Model):
     alcohol_frequency = models.CharField(
@@ -72,11 +121,18 @@ class Profile(models.Model):
     job_title = models.CharField(max_length=100, blank=True, null=True)
     life_goals = models.TextField(blank=True, null=True)
     location = models.CharField(max_length=100)
+    # Resolved from location through City on save
+    latitude = models.FloatField(blank=True, null=True)
+    longitude = models.FloatField(blank=True, null=True)
+    geohash = models.CharField(
+        max_length=GEOHASH_PRECISION, blank=True, db_index=True, editable=False)
     love_languages = ArrayField(
         models.CharField(max_length=20, choices=LOVE_LANGUAGE_CHOICES),
         blank=True,
         default=list
     )
+    max_distance = models.PositiveIntegerField(
+        blank=True, null=True, help_text='Maximum match distance in miles, empty for no limit')
     max_preferred_age = models.IntegerField(default=99)
     min_preferred_age = models.IntegerField(default=18)
     personality_type = models.CharField(
@@ -84,7 +140,11 @@ class Profile(models.Model):
     pet_preferences = models.CharField(
         max_length=15, choices=PET_CHOICES, default='none')
     phone_number = models.CharField(max_length=15, blank=True, null=True)
-    picture_urls = ArrayField(models.TextField(), blank=True, default=list)
+    # Photo manifest, {slot: PhotoEntry}, see users/photo_manifest.py.
+    # Written by complete_photo_upload and update_profile's delete_photos.
+    photos = models.JSONField(default=dict, blank=True, editable=False)
+    # Derived from photos whenever it changes; never written directly
+    picture_urls = ArrayField(models.TextField(), blank=True, default=list, editable=False)
     political_views = models.CharField(
         max_length=12, choices=POLITICAL_CHOICES, blank=True, null=True)
     preferred_gender = models.CharField(
@@ -112,19 +172,35 @@ class Profile(models.Model):
     zodiac_sign = models.CharField(
         max_length=15, choices=ZODIAC_CHOICES, blank=True, null=True)
 
+    # Compact encodings of the choice fields above, see users/bitsets.py.
+    # Kept in sync by save(); never written directly.
+    interests_bits = models.BigIntegerField(default=0, editable=False)
+    love_languages_bits = models.BigIntegerField(default=0, editable=False)
+    pronouns_bits = models.BigIntegerField(default=0, editable=False)
+    choice_codes = models.BinaryField(
+        max_length=CHOICE_CODES_WIDTH, default=bytes(CHOICE_CODES_WIDTH), editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Incremented in the database on every save, and whenever the user
+    # details or prompt responses serialized with the profile change. Used
+    # as the profile's ETag.
+    version = models.PositiveBigIntegerField(default=1, editable=False)
+
+    class Meta:
+        indexes = [
+            # two-sided gender preference lookups in get_candidate_users
+            models.Index(fields=['gender', 'preferred_gender'],
+                         name='profile_gender_pref_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.get_full_name()}'s Profile"
 
     def clean(self):
-        if not (1 <= len(self.picture_urls) <= 6):
+        if not (1 <= len(self.photos) <= MAX_PHOTOS):
             raise ValidationError(
-                'Users must have between 1 and 6 picture_urls.')
-        if self.picture_urls:
-            current_time = int(datetime.now().timestamp())
-            self.picture_urls = [
-                f"{url.split('?')[0]}?t={current_time}"
-                for url in self.picture_urls
-            ]
+                f'Users must have between 1 and {MAX_PHOTOS} photos.')
+        if not all(slot.isdigit() and int(slot) < MAX_PHOTOS for slot in self.photos):
+            raise ValidationError('Invalid photo slot')
 
         if self.pronouns and not all(pronoun in dict(PRONOUN_CHOICES) for pronoun in self.pronouns):
             raise ValidationError('Invalid pronoun choice provided')
@@ -143,9 +219,58 @@ class Profile(models.Model):
             return potential_matches
         return Profile.objects.none()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_location = instance.__dict__.get('location')
+        instance._loaded_photos = instance.__dict__.get('photos')
+        return instance
+
+    def sync_photos(self):
+        if self._state.adding or self.photos != getattr(self, '_loaded_photos', None):
+            self.picture_urls = photo_manifest.picture_urls(self.photos)
+            self._loaded_photos = self.photos
+
+    def sync_location(self):
+        location_changed = self.location != getattr(
+            self, '_loaded_location', None)
+        if location_changed or self.latitude is None:
+            city = City.lookup(self.location) if self.location else None
+            self.latitude = city.latitude if city else None
+            self.longitude = city.longitude if city else None
+            self._loaded_location = self.location
+        self.geohash = encode_geohash(self.latitude, self.longitude) \
+            if self.latitude is not None and self.longitude is not None else ''
+
+    def sync_encodings(self):
+        masks, self.choice_codes = encode_profile_fields({
+            field: getattr(self, field)
+            for field in (*MULTI_CHOICE_FIELDS, *SINGLE_CHOICE_FIELDS)
+        })
+        for column, mask in masks.items():
+            setattr(self, column, mask)
+
     def save(self, *args, **kwargs):
         self.full_clean()
+        self.sync_location()
+        self.sync_encodings()
+        self.sync_photos()
+        adding = self._state.adding
+        if not adding:
+            self.version = F('version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {
+                *update_fields, *ENCODED_FIELDS, *LOCATION_FIELDS, 'updated_at', 'version'}
+            if 'photos' in update_fields:
+                kwargs['update_fields'].add('picture_urls')
         super().save(*args, **kwargs)
+        if not adding:
+            self.refresh_from_db(fields=['version'])
+
+    @classmethod
+    def bump_version(cls, **lookup):
+        cls.objects.filter(**lookup).update(version=F('version') + 1)
 
 
 class PromptResponse(models.Model):
@@ -163,10 +288,117 @@ class PromptResponse(models.Model):
             )
         ]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        Profile.bump_version(pk=self.profile_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        Profile.bump_version(pk=self.profile_id)
+        return result
+
+
+class Swipe(models.Model):
+    """A like or pass, written in batches by users/swipes.py"""
+    swiper = models.ForeignKey(
+        User, related_name='swipes_made', on_delete=models.CASCADE)
+    swiped = models.ForeignKey(
+        User, related_name='swipes_received', on_delete=models.CASCADE)
+    liked = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # also serves the reverse "did they like me back" lookup
+            models.UniqueConstraint(
+                fields=['swiper', 'swiped'],
+                name='unique_swipe'
+            )
+        ]
+
 
 class Match(models.Model):
+    """A mutual match, stored once per pair with user1 < user2"""
     user1 = models.ForeignKey(
         User, related_name='match1', on_delete=models.CASCADE)
     user2 = models.ForeignKey(
         User, related_name='match2', on_delete=models.CASCADE)
     matched_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user1', 'user2'],
+                name='unique_match_pair'
+            ),
+            models.CheckConstraint(
+                check=models.Q(user1__lt=models.F('user2')),
+                name='match_pair_ordered'
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.user1_id > self.user2_id:
+            self.user1_id, self.user2_id = self.user2_id, self.user1_id
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            MatchEdge.objects.bulk_create(
+                MatchEdge.for_match(self), ignore_conflicts=True)
+
+
+class MatchEdge(models.Model):
+    """
+    Adjacency list of Match: one row per direction, so a user's matches are a
+    single range scan on (user, matched_at). Written alongside every Match.
+    """
+    user = models.ForeignKey(
+        User, related_name='match_edges', on_delete=models.CASCADE)
+    other = models.ForeignKey(
+        User, related_name='+', on_delete=models.CASCADE)
+    match = models.ForeignKey(
+        Match, related_name='edges', on_delete=models.CASCADE)
+    matched_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'other'],
+                name='unique_match_edge'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-matched_at'],
+                         name='match_edge_user_idx'),
+        ]
+
+    @staticmethod
+    def for_match(match: Match) -> list:
+        return [
+            MatchEdge(user_id=match.user1_id, other_id=match.user2_id,
+                      match=match, matched_at=match.matched_at),
+            MatchEdge(user_id=match.user2_id, other_id=match.user1_id,
+                      match=match, matched_at=match.matched_at),
+        ]
+
+
+class TopFive(models.Model):
+    """A user's precomputed picks, refreshed by the compute_top_five command"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='top_five')
+    # MatchData dicts, best pick first
+    picks = models.JSONField(default=list)
+    computed_at = models.DateTimeField()
+
+
+def empty_seen_filter() -> bytes:
+    return bytes(BLOOM_BITS // 8)
+
+
+class SeenFilter(models.Model):
+    """Bloom filter of the users someone has already seen or passed on, see users/seen.py"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='seen_filter')
+    bits = models.BinaryField(default=empty_seen_filter)
+    # entries added so far; false positives climb past BLOOM_CAPACITY
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,40 @@
+import base64
+import binascii
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(last_id: int) -> str:
+    """Encode the last id of a page into an opaque cursor"""
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Decode a cursor from encode_cursor, raising ValueError if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_limit(limit: Optional[str]) -> int:
+    """Parse the limit query param, clamping it to MAX_PAGE_SIZE"""
+    if limit in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        value = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid limit')
+    if value < 1:
+        raise ValueError('Invalid limit')
+    return min(value, MAX_PAGE_SIZE)
+
+
+def get_page_params(query_params) -> Tuple[int, Optional[int]]:
+    """Return (limit, after_id) from the request's query params"""
+    return (parse_limit(query_params.get('limit')),
+            decode_cursor(query_params.get('cursor')))
@@ -0,0 +1,80 @@
+"""
+The photo manifest kept in Profile.photos: one PhotoEntry per photo slot
+(0-5, the index in the photo's upload key), keyed by the slot as a string
+since it is stored as JSON. Photos are replaced and removed by slot; every
+URL handed out is derived from the entries. Originals are overwritten in
+place on re-upload, so their URLs carry the content hash as ?v=; the
+derivative keys contain it already.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+from .storage import object_url
+from .types import PhotoEntry
+
+MAX_PHOTOS = 6
+
+# slot (as a string) -> entry
+PhotoManifest = Dict[str, PhotoEntry]
+
+
+def list_size() -> str:
+    """The derivative shown in lists of people: the smallest"""
+    return min(settings.PHOTO_DERIVATIVE_SIZES, key=settings.PHOTO_DERIVATIVE_SIZES.get)
+
+
+def ordered_slots(manifest: PhotoManifest) -> List[str]:
+    return sorted(manifest, key=int)
+
+
+def with_photos(manifest: PhotoManifest, entries: Dict[int, PhotoEntry]) -> PhotoManifest:
+    return {**manifest, **{str(slot): entry for slot, entry in entries.items()}}
+
+
+def without_photos(manifest: PhotoManifest, slots: Iterable[int]) -> PhotoManifest:
+    removed = {str(slot) for slot in slots}
+    return {slot: entry for slot, entry in manifest.items() if slot not in removed}
+
+
+def entry_keys(entry: PhotoEntry) -> List[str]:
+    return [entry['key'], *entry.get('derivatives', {}).values()]
+
+
+def unreferenced_keys(old: PhotoManifest, new: PhotoManifest) -> List[str]:
+    """Stored objects the old manifest points to and the new one does not"""
+    kept = {key for entry in new.values() for key in entry_keys(entry)}
+    return [key for entry in old.values() for key in entry_keys(entry) if key not in kept]
+
+
+def photo_url(entry: PhotoEntry) -> str:
+    url = object_url(entry['key'])
+    return f"{url}?v={entry['hash']}" if entry.get('hash') else url
+
+
+def picture_urls(manifest: PhotoManifest) -> List[str]:
+    """Full size photo URLs in slot order (Profile.picture_urls)"""
+    return [photo_url(manifest[slot]) for slot in ordered_slots(manifest)]
+
+
+def list_picture_url(manifest: PhotoManifest) -> Optional[str]:
+    """The picture to show for a profile in lists of people"""
+    if not manifest:
+        return None
+    entry = manifest[ordered_slots(manifest)[0]]
+    key = entry.get('derivatives', {}).get(list_size())
+    return object_url(key) if key else photo_url(entry)
+
+
+def render_manifest(manifest: PhotoManifest) -> Dict[str, dict]:
+    """The manifest as clients see it: URLs instead of storage keys"""
+    return {
+        slot: {
+            'url': photo_url(entry),
+            'width': entry.get('width'),
+            'height': entry.get('height'),
+            'derivatives': {size: object_url(key)
+                            for size, key in entry.get('derivatives', {}).items()},
+        }
+        for slot, entry in ((slot, manifest[slot]) for slot in ordered_slots(manifest))
+    }
@@ -0,0 +1,116 @@
+"""
+Processing of uploaded photos. Once the client has uploaded through the
+URLs from get_presigned_urls it calls complete_photo_upload, which reads
+each photo back from S3, renders every PHOTO_DERIVATIVE_SIZES variant on
+derivative_pool and records the photo in the Profile.photos manifest by
+slot (users/photo_manifest.py). Lists of people (feed, matches, top five)
+show the smallest variant instead of the full-size upload.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from PIL import ExifTags, Image, ImageOps
+
+from .models import Profile
+from .photo_manifest import PhotoManifest, picture_urls, unreferenced_keys, with_photos
+from .profile_cache import profile_cache
+from .storage import photo_key, s3_client
+from .types import PhotoEntry
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITY = 80
+# derivative keys carry the source's content hash, so they never change
+DERIVATIVE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# EXIF orientations that turn the image a quarter turn
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+derivative_pool = ThreadPoolExecutor(
+    max_workers=settings.PHOTO_DERIVATIVE_WORKERS, thread_name_prefix='photo-derivatives')
+
+
+def derivative_key(user_id: int, index: int, size: str, digest: str) -> str:
+    return f'user_{user_id}/photo_{index}_{size}_{digest}.jpg'
+
+
+def render_derivatives(source: bytes) -> Tuple[Tuple[int, int], Dict[str, bytes]]:
+    """
+    The upright size of an image, and JPEG bytes of each
+    PHOTO_DERIVATIVE_SIZES variant of it; never upscales
+    """
+    sizes = sorted(settings.PHOTO_DERIVATIVE_SIZES.items(), key=lambda item: -item[1])
+    rendered = {}
+    with Image.open(BytesIO(source)) as image:
+        width, height = image.size
+        if image.getexif().get(ExifTags.Base.Orientation) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        # JPEGs decode straight at a reduced scale, still at least the largest size
+        image.draft('RGB', (sizes[0][1], sizes[0][1]))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        # largest first, each one resized from the last
+        for name, size in sizes:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            rendered[name] = output.getvalue()
+    return (width, height), {name: rendered[name] for name in settings.PHOTO_DERIVATIVE_SIZES}
+
+
+def process_photo(user_id: int, index: int) -> PhotoEntry:
+    """Render and store the derivatives of an uploaded photo; runs on derivative_pool"""
+    client, bucket = s3_client(), settings.AWS_STORAGE_BUCKET_NAME
+    key = photo_key(user_id, index)
+    source = client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    digest = hashlib.sha256(source).hexdigest()[:16]
+    (width, height), rendered = render_derivatives(source)
+    derivatives = {}
+    for size, body in rendered.items():
+        derivatives[size] = derivative_key(user_id, index, size, digest)
+        client.put_object(Bucket=bucket, Key=derivatives[size], Body=body,
+                          ContentType='image/jpeg', CacheControl=DERIVATIVE_CACHE_CONTROL)
+    return {'key': key, 'hash': digest, 'width': width, 'height': height,
+            'derivatives': derivatives}
+
+
+def delete_objects(keys: List[str]) -> None:
+    """Best effort removal of stored photos nothing points to any more"""
+    if not keys:
+        return
+    try:
+        s3_client().delete_objects(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Delete={
+            'Objects': [{'Key': key} for key in keys], 'Quiet': True})
+    except Exception as e:
+        logger.error(f"Error deleting photos {keys}: {str(e)}")
+
+
+def set_photos(user_id: int, entries: Dict[int, PhotoEntry]) -> PhotoManifest:
+    """
+    Put entries into the user's manifest, replacing those slots. Written
+    with an update rather than save(): photos can be processed before the
+    profile has the fields full_clean() requires.
+    """
+    with transaction.atomic():
+        current = Profile.objects.select_for_update().filter(
+            user_id=user_id).values_list('photos', flat=True).get()
+        manifest = with_photos(current, entries)
+        Profile.objects.filter(user_id=user_id).update(
+            photos=manifest, picture_urls=picture_urls(manifest), version=F('version') + 1)
+        # the original keys are reused, but replaced derivatives are not
+        stale = unreferenced_keys(current, manifest)
+        transaction.on_commit(lambda: delete_objects(stale))
+    profile_cache.invalidate(user_id)
+    return manifest
+
+
+def generate_derivatives(user_id: int, indexes: Iterable[int]) -> PhotoManifest:
+    """Process photos in parallel on derivative_pool and record them"""
+    futures = {index: derivative_pool.submit(process_photo, user_id, index)
+               for index in dict.fromkeys(indexes)}
+    return set_photos(user_id, {index: future.result() for index, future in futures.items()})
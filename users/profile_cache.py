@@ -0,0 +1,61 @@
+"""
+Serialized profiles cached by user id, see TwoTierCache. Each entry is
+(version, full payload); sparse fieldsets are cut from the full payload so
+one entry serves every variant. Entries are invalidated whenever a row
+that appears in the payload is saved or deleted.
+"""
+from typing import Optional, Set, Tuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .caching import TwoTierCache
+from .models import PROFILE_USER_FIELDS, Profile, PromptResponse, User
+from .serializers import serialize_profile
+
+ProfileEntry = Tuple[int, dict]
+
+profile_cache = TwoTierCache(
+    'profile_cache',
+    ttl=settings.PROFILE_CACHE_TTL,
+    local_size=settings.PROFILE_CACHE_LOCAL_SIZE,
+    local_ttl=settings.PROFILE_CACHE_LOCAL_TTL,
+)
+
+
+def get_cached_profile(user_id: int) -> Optional[ProfileEntry]:
+    return profile_cache.get(user_id)
+
+
+def cache_profile(profile: Profile) -> ProfileEntry:
+    """Serialize a profile loaded with profile_read_queryset() and cache it"""
+    entry = (profile.version, serialize_profile(profile))
+    profile_cache.fill(profile.user_id, entry)
+    return entry
+
+
+def select_fields(data: dict, fields: Optional[Set[str]]) -> dict:
+    if fields is None:
+        return data
+    return {name: value for name, value in data.items() if name in fields}
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def _profile_changed(sender, instance: Profile, **kwargs):
+    profile_cache.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance: User, update_fields=None, **kwargs):
+    # e.g. last_login updates leave the profile payload alone
+    if update_fields is None or set(update_fields) & set(PROFILE_USER_FIELDS):
+        profile_cache.invalidate(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=PromptResponse)
+def _prompt_response_changed(sender, instance: PromptResponse, **kwargs):
+    user_id = Profile.objects.filter(pk=instance.profile_id).values_list(
+        'user_id', flat=True).first()
+    if user_id is not None:
+        profile_cache.invalidate(user_id)
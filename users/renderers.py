@@ -0,0 +1,35 @@
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+
+# dates, decimals, UUIDs, lazy strings etc. become what they would in JSON,
+# so both formats carry the same values
+_encode_default = JSONEncoder().default
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Binary alternative to JSON, chosen with Accept: application/msgpack or ?format=msgpack"""
+    media_type = MSGPACK_MEDIA_TYPE
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    """Request bodies sent with Content-Type: application/msgpack"""
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,177 @@
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.db.models import F, QuerySet
+
+from .bitsets import (MULTI_CHOICE_FIELDS, SINGLE_CHOICE_FIELDS, bits_field,
+                      encode_profile_fields, popcount_array, unpack_choice_codes)
+from .models import Profile, User
+
+logger = logging.getLogger(__name__)
+
+# Single-choice profile fields used for compatibility, and how much a shared
+# value is worth. Unset values never count as a match.
+CHOICE_FIELD_WEIGHTS: Dict[str, float] = {
+    'relationship_goals': 3.0,
+    'family_plans': 3.0,
+    'religion': 1.5,
+    'political_views': 1.5,
+    'alcohol_frequency': 1.0,
+    'cannabis_friendly': 1.0,
+    'communication_style': 1.0,
+    'exercise_level': 1.0,
+    'dietary_preferences': 0.5,
+    'highest_education': 0.5,
+    'personality_type': 0.5,
+    'pet_preferences': 0.5,
+    'sleep_pattern': 0.5,
+    'social_media_usage': 0.5,
+    'covid_vaccine_status': 0.5,
+    'zodiac_sign': 0.25,
+}
+CHOICE_FIELDS: List[str] = list(CHOICE_FIELD_WEIGHTS)
+
+INTERESTS_WEIGHT = 4.0
+LOVE_LANGUAGES_WEIGHT = 2.0
+AGE_WEIGHT = 2.0
+# age gap (in years) at which the age penalty is at its maximum
+MAX_AGE_GAP = 20.0
+
+TOP_K = 5
+# upper bound on how many candidates are pulled into memory for one ranking;
+# past it only the most recently active are scored
+MAX_SCORED_CANDIDATES = 50000
+
+_CHOICE_WEIGHTS = np.array(
+    [CHOICE_FIELD_WEIGHTS[field] for field in CHOICE_FIELDS], dtype=np.float32)
+
+# columns pulled for each candidate, relative to User. The profile columns
+# are the precomputed encodings from users/bitsets.py, so no choice strings
+# are parsed while ranking.
+CANDIDATE_COLUMNS: List[str] = [
+    'id',
+    'birthdate',
+    'profile__interests_bits',
+    'profile__love_languages_bits',
+    'profile__choice_codes',
+]
+
+
+@dataclass
+class ProfileBatch:
+    """Column-oriented numeric encoding of a set of profiles"""
+    user_ids: np.ndarray        # (n,) int64
+    choices: np.ndarray         # (n, len(CHOICE_FIELDS)) uint8, 0 = unset
+    interests: np.ndarray       # (n,) int64 bitsets
+    love_languages: np.ndarray  # (n,) int64 bitsets
+    ages: np.ndarray            # (n,) float32, NaN when birthdate is unknown
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+
+def _ages(birthdates: Sequence[Optional[date]], today: date) -> np.ndarray:
+    days = np.array(birthdates, dtype='datetime64[D]')
+    unknown = np.isnat(days)
+    ages = (np.datetime64(today, 'D') - days).astype(np.float32) / 365.25
+    ages[unknown] = np.nan
+    return ages
+
+
+def encode_rows(rows: Iterable[tuple], today: Optional[date] = None) -> ProfileBatch:
+    """Encode rows shaped like CANDIDATE_COLUMNS into a ProfileBatch"""
+    today = today or date.today()
+    rows = list(rows)
+    if not rows:
+        return ProfileBatch(
+            np.empty(0, dtype=np.int64),
+            np.empty((0, len(CHOICE_FIELDS)), dtype=np.uint8),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float32))
+
+    user_ids, birthdates, interests, love_languages, choice_codes = zip(*rows)
+    return ProfileBatch(
+        np.array(user_ids, dtype=np.int64),
+        unpack_choice_codes(choice_codes, CHOICE_FIELDS),
+        np.array(interests, dtype=np.int64),
+        np.array(love_languages, dtype=np.int64),
+        _ages(birthdates, today),
+    )
+
+
+def encode_profile(profile: Profile, today: Optional[date] = None) -> ProfileBatch:
+    """Encode a single profile as a batch of one, from its current values"""
+    masks, choice_codes = encode_profile_fields({
+        field: getattr(profile, field)
+        for field in (*MULTI_CHOICE_FIELDS, *SINGLE_CHOICE_FIELDS)
+    })
+    row = (
+        profile.user_id,
+        profile.user.birthdate,
+        masks[bits_field('interests')],
+        masks[bits_field('love_languages')],
+        choice_codes,
+    )
+    return encode_rows([row], today)
+
+
+def _overlap(requester: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Jaccard similarity between one bitset and every candidate bitset"""
+    shared = popcount_array(candidates & requester).astype(np.float32)
+    union = popcount_array(candidates | requester).astype(np.float32)
+    return np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+
+def score_batch(requester: ProfileBatch, candidates: ProfileBatch) -> np.ndarray:
+    """Score every candidate against the requester in one vectorized pass"""
+    if not len(candidates):
+        return np.empty(0, dtype=np.float32)
+
+    requester_choices = requester.choices[0]
+    same_choice = (candidates.choices == requester_choices) & (
+        requester_choices != 0)
+    scores = same_choice.astype(np.float32) @ _CHOICE_WEIGHTS
+
+    scores += INTERESTS_WEIGHT * _overlap(
+        requester.interests[0], candidates.interests)
+    scores += LOVE_LANGUAGES_WEIGHT * _overlap(
+        requester.love_languages[0], candidates.love_languages)
+
+    age_gap = np.abs(candidates.ages - requester.ages[0])
+    age_penalty = np.minimum(np.nan_to_num(
+        age_gap, nan=MAX_AGE_GAP), MAX_AGE_GAP) / MAX_AGE_GAP
+    scores -= AGE_WEIGHT * age_penalty
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int = TOP_K) -> np.ndarray:
+    """Indexes of the k highest scores, best first, without sorting the whole array"""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        best = np.argpartition(scores, -k)[-k:]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind='stable')]
+
+
+def rank_candidates(user: User, candidates: QuerySet, k: int = TOP_K) -> List[Tuple[int, float]]:
+    """
+    Return the k best (user_id, score) pairs from a User queryset, already
+    narrowed in SQL (get_candidate_users filters on gender, age, distance,
+    matches and seen users). At most MAX_SCORED_CANDIDATES are scored: the
+    most recently active ones, with a warning logged when the pool is larger.
+    """
+    rows = list(candidates.order_by(F('last_login').desc(nulls_last=True), '-id').values_list(
+        *CANDIDATE_COLUMNS)[:MAX_SCORED_CANDIDATES + 1].iterator(chunk_size=2000))
+    if len(rows) > MAX_SCORED_CANDIDATES:
+        logger.warning(f"Scoring only the {MAX_SCORED_CANDIDATES} most recently active "
+                       f"candidates for user {user.id}")
+        rows = rows[:MAX_SCORED_CANDIDATES]
+    batch = encode_rows(rows)
+    scores = score_batch(encode_profile(user.profile), batch)
+    return [(int(batch.user_ids[i]), float(scores[i])) for i in top_k(scores, k)]
@@ -0,0 +1,40 @@
+import logging
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .bloom import BLOOM_CAPACITY, BloomFilter, contains_expression
+from .models import SeenFilter
+
+logger = logging.getLogger(__name__)
+
+
+def record_seen(user_id: int, seen_user_ids: Iterable[int]) -> None:
+    """Add users to user_id's seen filter"""
+    seen_user_ids = set(seen_user_ids)
+    if not seen_user_ids:
+        return
+    with transaction.atomic():
+        seen, _ = SeenFilter.objects.select_for_update().get_or_create(user_id=user_id)
+        bloom = BloomFilter(seen.bits)
+        # ids already in the filter (or colliding with it) are not counted again
+        seen.count += bloom.update(seen_user_ids)
+        seen.bits = bloom.to_bytes()
+        seen.save()
+    if seen.count > BLOOM_CAPACITY:
+        logger.warning(
+            f"Seen filter for user {user_id} is over capacity ({seen.count} entries)")
+
+
+def exclude_seen(queryset: QuerySet, user_id: int, id_field: str = 'id') -> QuerySet:
+    """
+    Drop rows already in user_id's seen filter. The filter is sent with the
+    query and probed per row, so the cost does not grow with the history.
+    """
+    bits = SeenFilter.objects.filter(user_id=user_id).values_list(
+        'bits', flat=True).first()
+    if bits is None:
+        return queryset
+    return queryset.alias(
+        _seen=contains_expression(bits, id_field)).filter(_seen=0)
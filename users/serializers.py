@@ -1,6 +1,11 @@
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, QuerySet
 from .models import Profile, Prompt, PromptResponse, Match
+from .photo_manifest import render_manifest
 from .choices import *
 
 User = get_user_model()
@@ -33,11 +38,19 @@ class PromptResponseSerializer(serializers.ModelSerializer):
                   'response', 'created_at', 'updated_at']
 
 
+class PhotoManifestField(serializers.JSONField):
+    """Profile.photos with URLs in place of storage keys"""
+
+    def to_representation(self, value):
+        return render_manifest(value)
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source='user', read_only=True)
     prompt_responses = PromptResponseSerializer(
         many=True, read_only=True, source='promptresponse_set'
     )
+    photos = PhotoManifestField(read_only=True)
 
     # Field display values
     alcohol_frequency_display = serializers.CharField(
@@ -152,7 +165,9 @@ class ProfileSerializer(serializers.ModelSerializer):
             'special_talents',
             # Photos
             'picture_urls',
+            'photos',
             # Preferences
+            'max_distance',
             'max_preferred_age',
             'min_preferred_age',
             'preferred_gender',
@@ -200,3 +215,149 @@ class MatchSerializer(serializers.ModelSerializer):
             'user2_profile',
             'matched_at'
         ]
+
+
+'''
+Fast read path
+'''
+
+# A compiled plan is a list of (key, getter) pairs, one per readable field of
+# a serializer, in the serializer's field order.
+Plan = List[Tuple[str, Callable[[Any], Any]]]
+
+
+def _scalar_converter(field: serializers.Field) -> Callable[[Any], Any]:
+    """Equivalent of field.to_representation for a non-None value"""
+    if isinstance(field, serializers.ChoiceField):
+        choices = field.choice_strings_to_values
+        return lambda value: value if value == '' else choices.get(str(value), value)
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, (serializers.DateField, serializers.DateTimeField, serializers.BooleanField,
+                          serializers.JSONField)):
+        return field.to_representation
+    raise TypeError(f'No fast path for {type(field).__name__}')
+
+
+def _compile_field(model, field: serializers.Field) -> Callable[[Any], Any]:
+    if isinstance(field, serializers.SerializerMethodField):
+        # get_<array field>_display methods: labels for each selected value
+        array_field = field.method_name[len('get_'):-len('_display')]
+        table = dict(model._meta.get_field(array_field).base_field.flatchoices)
+        get = attrgetter(array_field)
+        return lambda obj: [table.get(value) for value in values] if (values := get(obj)) else []
+
+    get = attrgetter(field.source)
+    if isinstance(field, serializers.ListSerializer):
+        plan = _compile(field.child)
+        return lambda obj: [_render(item, plan) for item in get(obj).all()]
+    if isinstance(field, serializers.Serializer):
+        plan = _compile(field)
+        return lambda obj: None if (value := get(obj)) is None else _render(value, plan)
+    if isinstance(field, serializers.ManyRelatedField):
+        return lambda obj: [item.pk for item in get(obj).all()]
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        get_id = attrgetter(f'{field.source}_id')
+        return get_id
+
+    if field.source.startswith('get_') and field.source.endswith('_display'):
+        # get_FOO_display without rebuilding the choices dict on every call
+        model_field = model._meta.get_field(field.source[len('get_'):-len('_display')])
+        table = dict(model_field.flatchoices)
+        get_value = attrgetter(model_field.attname)
+        return lambda obj: None if (value := get_value(obj)) is None else str(table.get(value, value))
+
+    if isinstance(field, serializers.ListField):
+        convert = _scalar_converter(field.child)
+        return lambda obj: None if (values := get(obj)) is None else [
+            None if value is None else convert(value) for value in values]
+    convert = _scalar_converter(field)
+    return lambda obj: None if (value := get(obj)) is None else convert(value)
+
+
+def _compile(serializer: serializers.Serializer) -> Plan:
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    return [(name, _compile_field(model, field))
+            for name, field in serializer.fields.items() if not field.write_only]
+
+
+def _render(instance, plan: Plan) -> dict:
+    return {name: get(instance) for name, get in plan}
+
+
+@lru_cache(maxsize=None)
+def _profile_plan() -> Plan:
+    return _compile(ProfileSerializer())
+
+
+def serialize_profile(profile: Profile, fields: Optional[Set[str]] = None) -> dict:
+    """
+    Same output as ProfileSerializer(profile).data, from a plan compiled
+    once from ProfileSerializer's fields instead of running DRF per field.
+    Load profiles with profile_read_queryset for a constant number of
+    queries. `fields` limits the output to those keys, in the usual order.
+    """
+    plan = _profile_plan()
+    if fields is not None:
+        plan = [(name, get) for name, get in plan if name in fields]
+    return _render(profile, plan)
+
+
+def readable_fields(serializer: serializers.Serializer) -> List[str]:
+    return [name for name, field in serializer.fields.items() if not field.write_only]
+
+
+# nested relations of a profile payload, only sent when expanded
+PROFILE_EXPANDABLE = ('user_details', 'prompts', 'prompt_responses')
+
+
+@lru_cache(maxsize=None)
+def _profile_field_dependencies() -> Dict[str, Tuple[Tuple[str, ...], Tuple[Any, ...], Tuple[Any, ...]]]:
+    """
+    For each ProfileSerializer field: the Profile columns it reads and the
+    select_related / prefetch_related lookups it needs
+    """
+    dependencies = {}
+    for name, field in ProfileSerializer().fields.items():
+        if isinstance(field, serializers.SerializerMethodField):
+            columns = (field.method_name[len('get_'):-len('_display')],)
+            dependencies[name] = (columns, (), ())
+        elif isinstance(field, serializers.ListSerializer):
+            dependencies[name] = ((), (), (Prefetch(
+                field.source, queryset=PromptResponse.objects.select_related('prompt')),))
+        elif isinstance(field, serializers.ManyRelatedField):
+            dependencies[name] = ((), (), (field.source,))
+        elif isinstance(field, serializers.Serializer):
+            columns = tuple(f'{field.source}__{child.source}'
+                            for child in field.fields.values() if not child.write_only)
+            dependencies[name] = (columns, (field.source,), ())
+        elif field.source.startswith('get_') and field.source.endswith('_display'):
+            columns = (field.source[len('get_'):-len('_display')],)
+            dependencies[name] = (columns, (), ())
+        else:
+            dependencies[name] = ((field.source,), (), ())
+    return dependencies
+
+
+def profile_read_queryset(fields: Optional[Set[str]] = None) -> QuerySet:
+    """
+    Profile queryset loading exactly what serialize_profile needs for these
+    output keys: the columns via only(), and relations only when requested
+    """
+    dependencies = _profile_field_dependencies()
+    names = dependencies.keys() if fields is None else fields
+    columns, select, prefetch = {'id', 'user', 'version'}, [], []
+    for name in names:
+        field_columns, field_select, field_prefetch = dependencies[name]
+        columns.update(field_columns)
+        select.extend(field_select)
+        prefetch.extend(field_prefetch)
+
+    queryset = Profile.objects.select_related(*select).prefetch_related(*prefetch)
+    if fields is not None:
+        queryset = queryset.only(*columns)
+    return queryset
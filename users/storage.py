@@ -0,0 +1,116 @@
+"""
+S3 access shared by every request in the process. Creating a boto3 client
+costs tens of milliseconds (credential chain, endpoint data, model
+loading), so one client is built on first use and reused. boto3 clients
+are thread-safe; the session that builds them is not, hence the lock.
+
+Presigned URLs need no request to S3, only SigV4 signing. presign_puts()
+signs a whole batch with botocore's own query-string signer, set up once,
+instead of going through the client's per-call request machinery
+(parameter validation, serialization, endpoint resolution, event hooks).
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+import boto3
+from botocore.auth import S3SigV4QueryAuth
+from botocore.awsrequest import AWSRequest
+from botocore.config import Config
+from botocore.exceptions import NoCredentialsError
+from django.conf import settings
+
+# connections kept per client; upload-completion work shares it with requests
+S3_MAX_POOL_CONNECTIONS = 32
+
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_client = None
+_object_bases: Dict[str, Tuple[str, str, str]] = {}
+_PROBE_KEY = 'probe'
+
+
+def _get_session() -> boto3.session.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = boto3.session.Session(
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME)
+    return _session
+
+
+def s3_client():
+    """The process-wide S3 client, created on first use"""
+    global _client
+    if _client is None:
+        session = _get_session()
+        with _lock:
+            if _client is None:
+                _client = session.client(
+                    's3',
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    config=Config(signature_version='s3v4',
+                                  max_pool_connections=S3_MAX_POOL_CONNECTIONS))
+    return _client
+
+
+def reset_s3_client() -> None:
+    """Drop the shared client, e.g. after changing settings in tests"""
+    global _session, _client
+    with _lock:
+        _session = _client = None
+        _object_bases.clear()
+
+
+def photo_key(user_id: int, index: int) -> str:
+    return f'user_{user_id}/photo_{index}.jpg'
+
+
+def _object_base(bucket: str) -> Tuple[str, str, str]:
+    """
+    (scheme://host, host, path prefix) of bucket's objects, as the shared
+    client addresses them (virtual host or path style, endpoint, region);
+    read once per bucket from one URL presigned by the client itself
+    """
+    base = _object_bases.get(bucket)
+    if base is None:
+        url = urlsplit(s3_client().generate_presigned_url(
+            'put_object', Params={'Bucket': bucket, 'Key': _PROBE_KEY}))
+        base = (f'{url.scheme}://{url.netloc}', url.netloc,
+                url.path[:-len(_PROBE_KEY)])
+        _object_bases[bucket] = base
+    return base
+
+
+def object_url(key: str, bucket: str = None) -> str:
+    """Where clients read an object: PHOTO_BASE_URL (e.g. a CDN) or the bucket itself"""
+    base = settings.PHOTO_BASE_URL
+    if base is None:
+        origin, _, prefix = _object_base(bucket or settings.AWS_STORAGE_BUCKET_NAME)
+        base = origin + prefix
+    return base.rstrip('/') + '/' + quote(key, safe='/-_.~')
+
+
+def presign_puts(keys: Iterable[str], expires_in: int = None, bucket: str = None) -> List[str]:
+    """
+    Presigned PUT URLs for keys, in order; the same URLs
+    generate_presigned_url('put_object', ...) gives for the shared client.
+    """
+    bucket = bucket or settings.AWS_STORAGE_BUCKET_NAME
+    credentials = _get_session().get_credentials()
+    if credentials is None:
+        raise NoCredentialsError()
+    signer = S3SigV4QueryAuth(
+        credentials.get_frozen_credentials(), 's3', settings.AWS_S3_REGION_NAME,
+        expires=expires_in or settings.PRESIGNED_URL_EXPIRY)
+
+    base, _, prefix = _object_base(bucket)
+    urls = []
+    for key in keys:
+        request = AWSRequest(method='PUT', url=base + prefix + quote(key, safe='/~'))
+        signer.add_auth(request)
+        urls.append(request.url)
+    return urls
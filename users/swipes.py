@@ -0,0 +1,174 @@
+import atexit
+import logging
+import threading
+import time
+from itertools import groupby
+from typing import Dict, Iterable, List, Set, Tuple
+
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from .models import Match, MatchEdge, Swipe, User
+from .seen import record_seen
+
+logger = logging.getLogger(__name__)
+
+# flush when this many swipes are buffered, or this many seconds after the
+# oldest buffered swipe, whichever comes first
+SWIPE_BUFFER_SIZE = 500
+SWIPE_FLUSH_INTERVAL = 1.0
+# flushes a swipe may fail before it is dropped
+SWIPE_FLUSH_ATTEMPTS = 3
+
+
+def find_mutual_likes(likes: Iterable[Tuple[int, int]]) -> Set[Tuple[int, int]]:
+    """
+    Canonical (lower id, higher id) pairs among likes where both stored
+    swipes are likes. Read back from Swipe rather than trusted from the
+    batch: a like sent after a pass is not stored, so it must not match.
+    """
+    likes = set(likes)
+    if not likes:
+        return set()
+    user_ids = {user_id for pair in likes for user_id in pair}
+    stored = set(Swipe.objects.filter(
+        liked=True, swiper_id__in=user_ids, swiped_id__in=user_ids,
+    ).values_list('swiper_id', 'swiped_id'))
+    return {(min(pair), max(pair)) for pair in likes
+            if pair in stored and pair[::-1] in stored}
+
+
+def create_matches(pairs: Iterable[Tuple[int, int]]) -> List[Match]:
+    """
+    Ensure a Match (and its two MatchEdge rows) exists for each canonical
+    pair. The unique constraints make this safe to repeat and to race:
+    each pair is stored exactly once.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return []
+    pair_filter = Q()
+    for user1_id, user2_id in pairs:
+        pair_filter |= Q(user1_id=user1_id, user2_id=user2_id)
+    with transaction.atomic():
+        Match.objects.bulk_create(
+            [Match(user1_id=user1_id, user2_id=user2_id)
+             for user1_id, user2_id in sorted(pairs)],
+            ignore_conflicts=True,
+        )
+        matches = list(Match.objects.filter(pair_filter))
+        MatchEdge.objects.bulk_create(
+            [edge for match in matches for edge in MatchEdge.for_match(match)],
+            ignore_conflicts=True,
+        )
+    return matches
+
+
+def write_swipes(swipes: Dict[Tuple[int, int], bool]) -> int:
+    """
+    Persist (swiper_id, swiped_id) -> liked decisions in one bulk insert, then
+    create matches for mutual likes. Returns the number of mutual pairs.
+    """
+    # users deleted since the swipe was accepted would fail the whole insert
+    existing = set(User.objects.filter(
+        id__in={user_id for pair in swipes for user_id in pair}).values_list('id', flat=True))
+    swipes = {pair: liked for pair, liked in swipes.items() if existing.issuperset(pair)}
+    if not swipes:
+        return 0
+    # A swipe is final: a repeat for the same pair keeps the first decision
+    Swipe.objects.bulk_create(
+        [Swipe(swiper_id=swiper_id, swiped_id=swiped_id, liked=liked)
+         for (swiper_id, swiped_id), liked in swipes.items()],
+        ignore_conflicts=True,
+    )
+    # Checking only after our insert committed means that of two racing
+    # reciprocal likes, at least one flush sees the other
+    matches = create_matches(find_mutual_likes(
+        pair for pair, liked in swipes.items() if liked))
+
+    for swiper_id, pairs in groupby(sorted(swipes), key=lambda pair: pair[0]):
+        record_seen(swiper_id, [swiped_id for _, swiped_id in pairs])
+    return len(matches)
+
+
+class SwipeBuffer:
+    """
+    Per-process buffer of swipe decisions, flushed in bulk by size, by age
+    (from a background thread) and at exit. Swipes still buffered when the
+    process dies are lost, as are swipes whose flush failed
+    SWIPE_FLUSH_ATTEMPTS times.
+    """
+
+    def __init__(self, max_size: int = SWIPE_BUFFER_SIZE, flush_interval: float = SWIPE_FLUSH_INTERVAL):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._swipes: Dict[Tuple[int, int], bool] = {}
+        # failed flushes per buffered swipe
+        self._attempts: Dict[Tuple[int, int], int] = {}
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, swiper_id: int, decisions: Iterable[Tuple[int, bool]]) -> None:
+        with self._lock:
+            for swiped_id, liked in decisions:
+                self._swipes.setdefault((swiper_id, swiped_id), liked)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._swipes) >= self.max_size
+            self._ensure_flusher()
+        if full:
+            try:
+                self.flush()
+            except Exception as e:
+                # the swipes are accepted either way; the flush is retried
+                logger.error(f"Error flushing swipes: {str(e)}")
+
+    def flush(self) -> int:
+        with self._lock:
+            swipes, self._swipes = self._swipes, {}
+            attempts, self._attempts = self._attempts, {}
+            self._oldest = None
+        try:
+            return write_swipes(swipes)
+        except Exception:
+            # write_swipes is idempotent, so put the batch back for a retry
+            dropped = 0
+            with self._lock:
+                for pair, liked in swipes.items():
+                    failures = attempts.get(pair, 0) + 1
+                    if failures >= SWIPE_FLUSH_ATTEMPTS:
+                        dropped += 1
+                        continue
+                    self._swipes.setdefault(pair, liked)
+                    self._attempts[pair] = failures
+                if self._swipes and self._oldest is None:
+                    self._oldest = time.monotonic()
+            if dropped:
+                logger.error(f"Dropped {dropped} swipes after {SWIPE_FLUSH_ATTEMPTS} failed flushes")
+            raise
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name='swipe-flusher', daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval / 2)
+            with self._lock:
+                due = self._oldest is not None and \
+                    time.monotonic() - self._oldest >= self.flush_interval
+            if not due:
+                continue
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing swipes: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+swipe_buffer = SwipeBuffer()
+atexit.register(swipe_buffer.flush)
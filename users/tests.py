@@ -1,3 +1,1385 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+import msgpack
+import numpy as np
+import zstandard
+from moto import mock_aws
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import QueryDict
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .bitsets import (encode_profile_fields, exclude_any, exclude_choices, from_mask, popcount_array,
+                      shared_count, to_mask)
+from .bloom import BloomFilter, bit_positions, contains_expression
+from .caching import TwoTierCache
+from .fieldsets import parse_fieldset
+from .geo import cell_size_degrees, covering_cells, distance_expression, encode_geohash
+from .http import if_match_fails, if_none_match, make_etag
+from .login import LoginBookkeeping
+from .matching import explain_candidate_query, get_candidate_users, parse_candidate_filters
+from .models import City, Match, MatchEdge, Profile, Prompt, PromptResponse, SeenFilter, Swipe, TopFive, User
+from .pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor, get_page_params
+from .photo_manifest import photo_url, unreferenced_keys, with_photos, without_photos
+from .photos import process_photo
+from .profile_cache import profile_cache
+from .renderers import MessagePackParser, MessagePackRenderer
+from .scoring import (AGE_WEIGHT, CHOICE_FIELD_WEIGHTS, INTERESTS_WEIGHT, LOVE_LANGUAGES_WEIGHT,
+                      MAX_AGE_GAP, encode_rows, rank_candidates, score_batch, top_k)
+from .seen import record_seen
+from .serializers import ProfileSerializer, profile_read_queryset, serialize_profile
+from .storage import photo_key, presign_puts, reset_s3_client, s3_client
+from .swipes import SWIPE_FLUSH_ATTEMPTS, SwipeBuffer, write_swipes
+from .throttling import LocalBuckets, client_ip, request_cost, throttle_wait
+from .tokens import BlacklistFilter, RefreshToken
+from .top_five import compute_chunk, compute_picks, save_picks
+from .user_cache import cache_user, get_cached_user, user_cache
+from .views import MAX_PROFILES_PER_REQUEST
+
+
+def photo_entry(user_id, slot, digest='0123456789abcdef', **derivatives):
+    return {'key': f'user_{user_id}/photo_{slot}.jpg', 'hash': digest,
+            'width': 1080, 'height': 1350, 'derivatives': derivatives}
+
+
+def make_user(email, gender, preferred_gender, birthdate, location='New York', **profile_fields):
+    user = User.objects.create(
+        email=email, username=email, first_name=email.split('@')[0], birthdate=birthdate)
+    Profile.objects.create(
+        user=user,
+        gender=gender,
+        preferred_gender=preferred_gender,
+        location=location,
+        photos={'0': photo_entry(user.id, 0)},
+        **profile_fields
+    )
+    return user
+
+
+class CandidateQueryTests(TestCase):
+    def setUp(self):
+        self.requester = make_user(
+            'alex@example.com', 'male', 'female', date(1994, 6, 1),
+            min_preferred_age=25, max_preferred_age=40)
+
+    def test_candidates_must_accept_the_requester(self):
+        accepts = make_user('bea@example.com', 'female',
+                            'male', date(1995, 1, 1))
+        wrong_gender = make_user(
+            'cara@example.com', 'female', 'female', date(1995, 1, 1))
+        too_old_for_them = make_user(
+            'dana@example.com', 'female', 'male', date(1995, 1, 1),
+            min_preferred_age=18, max_preferred_age=24)
+
+        candidates = set(get_candidate_users(
+            self.requester).values_list('id', flat=True))
+
+        self.assertIn(accepts.id, candidates)
+        self.assertNotIn(wrong_gender.id, candidates)
+        self.assertNotIn(too_old_for_them.id, candidates)
+
+    def test_candidate_query_is_an_index_scan(self):
+        # The tables are tiny here, so make sequential scans prohibitively
+        # expensive; a Seq Scan left in the plan means no index can serve it.
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = explain_candidate_query(self.requester)
+        self.assertNotIn('Seq Scan', plan, plan)
+
+
+class MatchesEndpointTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male',
+                              'female', date(1994, 6, 1))
+        self.matched = [
+            make_user(f'match{i}@example.com', 'female',
+                      'male', date(1995, 1, 1))
+            for i in range(5)
+        ]
+        for other in self.matched:
+            Match.objects.create(user1=other, user2=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_matches_are_loaded_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('matches'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {match['id'] for match in response.data['matches']},
+            {other.id for other in self.matched})
+        self.assertEqual(
+            response.data['matches'][0]['picture_url'],
+            self.matched[-1].profile.picture_urls[0])
+
+    def test_matches_show_the_smallest_photo(self):
+        other = self.matched[0]
+        Profile.objects.filter(user=other).update(photos={
+            '0': photo_entry(other.id, 0, thumb='user_1/photo_0_thumb.jpg',
+                             large='user_1/photo_0_large.jpg')})
+
+        response = self.client.get(reverse('matches'))
+        pictures = {match['id']: match['picture_url'] for match in response.data['matches']}
+        self.assertTrue(pictures[other.id].endswith('/user_1/photo_0_thumb.jpg'))
+        self.assertEqual(pictures[self.matched[1].id], self.matched[1].profile.picture_urls[0])
+
+    def test_authenticated_user_is_cached_between_requests(self):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.assertNumQueries(2):
+            client.get(reverse('matches'))
+        with self.assertNumQueries(1):
+            response = client.get(reverse('matches'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_matches_can_be_rendered_as_msgpack(self):
+        expected = self.client.get(reverse('matches')).json()
+        response = self.client.get(
+            reverse('matches'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+
+class ProfileVersionTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male',
+                              'female', date(1994, 6, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('get_profile', args=[self.user.id])
+
+    def test_unchanged_profile_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        # served from the profile cache
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.user.profile.bio = 'Updated'
+        self.user.profile.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_profile_is_invalidated_on_change(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'fields': 'bio'})
+        self.assertEqual(response.data, {'bio': ''})
+
+        prompt = Prompt.objects.create(text='Best trip?')
+        PromptResponse.objects.create(
+            profile=self.user.profile, prompt=prompt, response='Lisbon')
+        response = self.client.get(self.url, {'expand': 'prompt_responses'})
+        self.assertEqual(
+            [r['response'] for r in response.data['prompt_responses']], ['Lisbon'])
+
+    def test_update_with_stale_etag_is_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        update_url = reverse('update_profile', args=[self.user.id])
+
+        response = self.client.patch(
+            update_url, {'bio': 'First'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.patch(
+            update_url, {'bio': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.bio, 'First')
+
+    def test_412_carries_the_current_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        update_url = reverse('update_profile', args=[self.user.id])
+        current = self.client.patch(update_url, {'bio': 'First'}, format='json')['ETag']
+        self.assertNotEqual(current, etag)
+
+        response = self.client.patch(
+            update_url, {'bio': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual((response.status_code, response['ETag']), (412, current))
+        # a weakened copy of the current tag, as compression sends it, still matches
+        response = self.client.patch(
+            update_url, {'bio': 'Second'}, format='json', HTTP_IF_MATCH=f'W/{current}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url)['ETag'], response['ETag'])
+
+    def test_revalidation_without_a_cached_entry_reads_only_the_version(self):
+        etag = self.client.get(self.url)['ETag']
+        cache.clear()
+        profile_cache.clear_local()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+
+class ProfileChoicesTests(SimpleTestCase):
+    def test_matching_etag_is_not_modified(self):
+        client = APIClient()
+        response = client.get(reverse('profile_choices'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('gender', response.json())
+
+        response = client.get(reverse('profile_choices'),
+                              HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_response_is_compressed_as_negotiated(self):
+        client = APIClient()
+        plain = client.get(reverse('profile_choices')).content
+
+        response = client.get(reverse('profile_choices'),
+                              HTTP_ACCEPT_ENCODING='gzip, zstd')
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        self.assertEqual(
+            zstandard.ZstdDecompressor().decompress(response.content), plain)
+
+        response = client.get(reverse('profile_choices'),
+                              HTTP_ACCEPT_ENCODING='zstd;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain)
+
+
+class AuthThrottleTests(SimpleTestCase):
+    def test_buckets_are_spent_together(self):
+        buckets = LocalBuckets()
+        costs = {'ip': ((5, 1), 1), 'account': ((2, 0.5), 1)}
+        self.assertEqual(buckets.take(costs), 0)
+        self.assertEqual(buckets.take(costs), 0)
+        # the account bucket is empty, so the IP bucket is left alone too
+        self.assertAlmostEqual(buckets.take(costs), 2, places=2)
+        self.assertEqual(buckets.take({'ip': ((5, 1), 3)}), 0)
+
+    def test_cost_scales_the_wait(self):
+        buckets = LocalBuckets()
+        self.assertEqual(buckets.take({'ip': ((4, 1), 4)}), 0)
+        self.assertAlmostEqual(buckets.take({'ip': ((4, 1), 3)}), 3, places=2)
+
+    @override_settings(AUTH_THROTTLE_RATES={'ip': (30, 0.5), 'account': (10, 1 / 30)})
+    def test_backlog_cost_stays_payable_and_spares_accounts(self):
+        with mock.patch('users.throttling.buckets', LocalBuckets()), \
+                mock.patch('users.throttling.hashing_depth', return_value=10 ** 6):
+            self.assertEqual(request_cost(30), 15)
+            self.assertEqual(throttle_wait('10.0.0.1', 'victim@example.com'), 0)
+            self.assertEqual(throttle_wait('10.0.0.1', 'victim@example.com'), 0)
+            # the attacker's IP is dry; the victim's account has tokens left
+            self.assertGreater(throttle_wait('10.0.0.1', 'victim@example.com'), 0)
+            for i in range(8):
+                self.assertEqual(throttle_wait(f'10.0.1.{i}', 'victim@example.com'), 0)
+
+    def test_client_ip_ignores_forwarded_for_without_proxies(self):
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.2',
+                                        HTTP_X_FORWARDED_FOR='203.0.113.9')
+        self.assertEqual(client_ip(request), '10.0.0.2')
+
+
+class TokenObtainThrottleTests(TestCase):
+    def test_token_endpoint_is_throttled_per_account(self):
+        user = make_user('throttled@example.com', 'male', 'female', date(1990, 1, 1))
+        user.set_password('right password')
+        user.save()
+        client = APIClient()
+        statuses = [client.post(reverse('token_obtain_pair'),
+                                {'email': 'throttled@example.com', 'password': 'wrong'},
+                                format='json').status_code
+                    for _ in range(11)]
+        self.assertEqual(statuses[:10], [401] * 10)
+        self.assertEqual(statuses[10], 429)
+
+
+class PresignTests(SimpleTestCase):
+    def tearDown(self):
+        reset_s3_client()
+
+    def assertSignedLikeBotocore(self, key):
+        reset_s3_client()
+        expected = urlsplit(s3_client().generate_presigned_url(
+            'put_object', Params={'Bucket': 'topfive-photos', 'Key': key}, ExpiresIn=3600))
+        signed_at = datetime.strptime(parse_qs(expected.query)['X-Amz-Date'][0], '%Y%m%dT%H%M%SZ')
+        with mock.patch('botocore.auth.get_current_datetime', return_value=signed_at):
+            url = urlsplit(presign_puts([key], 3600, bucket='topfive-photos')[0])
+        self.assertEqual((url.netloc, url.path, parse_qs(url.query)),
+                         (expected.netloc, expected.path, parse_qs(expected.query)))
+
+    def test_batch_matches_botocore(self):
+        self.assertSignedLikeBotocore('user_1/photo_0.jpg')
+        self.assertSignedLikeBotocore('user_1/a b+c.jpg')
+
+    @override_settings(AWS_S3_ENDPOINT_URL='http://localhost:5000', AWS_S3_REGION_NAME='eu-west-2')
+    def test_batch_matches_botocore_on_custom_endpoint(self):
+        self.assertSignedLikeBotocore('user_1/photo_0.jpg')
+
+
+def jpeg(width, height):
+    output = BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(output, 'JPEG')
+    return output.getvalue()
+
+
+@mock_aws
+@override_settings(AWS_STORAGE_BUCKET_NAME='topfive-photos')
+class PhotoDerivativeTests(SimpleTestCase):
+    def setUp(self):
+        reset_s3_client()
+        s3_client().create_bucket(Bucket='topfive-photos')
+
+    def tearDown(self):
+        reset_s3_client()
+
+    def stored_size(self, key):
+        body = s3_client().get_object(Bucket='topfive-photos', Key=key)['Body'].read()
+        return Image.open(BytesIO(body)).size
+
+    @override_settings(PHOTO_DERIVATIVE_SIZES={'thumb': 160, 'large': 1080})
+    def test_derivatives_fit_each_size_without_upscaling(self):
+        s3_client().put_object(Bucket='topfive-photos', Key=photo_key(7, 2), Body=jpeg(4000, 3000))
+        s3_client().put_object(Bucket='topfive-photos', Key=photo_key(7, 3), Body=jpeg(600, 900))
+
+        entry = process_photo(7, 2)
+        self.assertEqual((entry['key'], entry['width'], entry['height']), (photo_key(7, 2), 4000, 3000))
+        self.assertEqual(self.stored_size(entry['derivatives']['thumb']), (160, 120))
+        self.assertEqual(self.stored_size(entry['derivatives']['large']), (1080, 810))
+
+        entry = process_photo(7, 3)
+        self.assertEqual(self.stored_size(entry['derivatives']['large']), (600, 900))
+
+    def test_photos_are_versioned_by_content(self):
+        s3_client().put_object(Bucket='topfive-photos', Key=photo_key(7, 0), Body=jpeg(800, 600))
+        first = process_photo(7, 0)
+        self.assertEqual(process_photo(7, 0), first)
+
+        s3_client().put_object(Bucket='topfive-photos', Key=photo_key(7, 0), Body=jpeg(600, 800))
+        second = process_photo(7, 0)
+        self.assertNotEqual(second['hash'], first['hash'])
+        self.assertNotEqual(photo_url(second), photo_url(first))
+        self.assertNotEqual(second['derivatives']['thumb'], first['derivatives']['thumb'])
+
+
+@mock_aws
+@override_settings(AWS_STORAGE_BUCKET_NAME='topfive-photos')
+class CompletePhotoUploadTests(TestCase):
+    def setUp(self):
+        reset_s3_client()
+        s3_client().create_bucket(Bucket='topfive-photos')
+        self.owner = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.other = make_user('bea@example.com', 'female', 'male', date(1995, 1, 1))
+        s3_client().put_object(Bucket='topfive-photos', Key=photo_key(self.owner.id, 1),
+                               Body=jpeg(800, 600))
+        self.client = APIClient()
+
+    def tearDown(self):
+        reset_s3_client()
+
+    def complete(self, as_user):
+        self.client.force_authenticate(as_user)
+        return self.client.post(reverse('complete_photo_upload', args=[self.owner.id]),
+                                {'photo_indexes': [1]}, format='json')
+
+    def test_owner_records_the_photo(self):
+        response = self.complete(self.owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['photos']), ['0', '1'])
+        self.assertEqual(len(Profile.objects.get(user=self.owner).picture_urls), 2)
+
+    def test_other_users_are_forbidden(self):
+        before = Profile.objects.get(user=self.owner).photos
+        response = self.complete(self.other)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Profile.objects.get(user=self.owner).photos, before)
+
+
+class PhotoManifestTests(SimpleTestCase):
+    def test_slots_are_replaced_and_removed_independently(self):
+        manifest = with_photos({}, {0: photo_entry(1, 0), 3: photo_entry(1, 3)})
+        manifest = with_photos(manifest, {3: photo_entry(1, 3, 'fedcba9876543210')})
+        self.assertEqual(manifest['3']['hash'], 'fedcba9876543210')
+        self.assertEqual(manifest['0'], photo_entry(1, 0))
+
+        self.assertEqual(list(without_photos(manifest, [0])), ['3'])
+        self.assertEqual(unreferenced_keys(manifest, without_photos(manifest, [0])),
+                         ['user_1/photo_0.jpg'])
+
+    def test_urls_only_change_with_the_photo(self):
+        profile = Profile(photos={'0': photo_entry(1, 0)})
+        profile.sync_photos()
+        urls = profile.picture_urls
+        self.assertTrue(urls[0].endswith('/user_1/photo_0.jpg?v=0123456789abcdef'))
+
+        profile.bio = 'Changed'
+        profile.sync_photos()
+        self.assertEqual(profile.picture_urls, urls)
+
+
+class SwipeTests(TestCase):
+    def setUp(self):
+        self.alex = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.bea = make_user('bea@example.com', 'female', 'male', date(1995, 1, 1))
+        # never flushed by age while a test runs
+        self.buffer = SwipeBuffer(flush_interval=3600)
+
+    def test_flush_writes_buffered_swipes(self):
+        self.buffer.add(self.alex.id, [(self.bea.id, False)])
+        self.assertFalse(Swipe.objects.exists())
+
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(
+            list(Swipe.objects.values_list('swiper_id', 'swiped_id', 'liked')),
+            [(self.alex.id, self.bea.id, False)])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_buffer_flushes_when_full(self):
+        buffer = SwipeBuffer(max_size=1, flush_interval=3600)
+        buffer.add(self.alex.id, [(self.bea.id, True)])
+        self.assertTrue(Swipe.objects.filter(swiper=self.alex).exists())
+
+    def test_repeated_swipe_keeps_the_first_decision(self):
+        self.buffer.add(self.alex.id, [(self.bea.id, False)])
+        self.buffer.add(self.alex.id, [(self.bea.id, True)])
+        self.buffer.flush()
+        write_swipes({(self.alex.id, self.bea.id): True})
+
+        self.assertEqual(
+            list(Swipe.objects.values_list('liked', flat=True)), [False])
+
+    def test_mutual_likes_create_one_match(self):
+        self.buffer.add(self.bea.id, [(self.alex.id, True)])
+        self.buffer.add(self.alex.id, [(self.bea.id, True)])
+        self.assertEqual(self.buffer.flush(), 1)
+        # liking back in a later batch does not match the pair again
+        write_swipes({(self.alex.id, self.bea.id): True, (self.bea.id, self.alex.id): True})
+
+        match = Match.objects.get()
+        self.assertEqual((match.user1_id, match.user2_id), (self.alex.id, self.bea.id))
+        self.assertEqual(
+            set(MatchEdge.objects.values_list('user_id', 'other_id')),
+            {(self.alex.id, self.bea.id), (self.bea.id, self.alex.id)})
+
+    def test_like_after_a_pass_does_not_match(self):
+        write_swipes({(self.alex.id, self.bea.id): False})
+        self.assertEqual(write_swipes({(self.alex.id, self.bea.id): True,
+                                       (self.bea.id, self.alex.id): True}), 0)
+        self.assertFalse(Match.objects.exists())
+        # nor once the other side's like is already stored
+        self.assertEqual(write_swipes({(self.alex.id, self.bea.id): True}), 0)
+        self.assertFalse(Match.objects.exists())
+
+    def test_swipes_on_deleted_users_are_dropped(self):
+        cara = make_user('cara@example.com', 'female', 'male', date(1995, 1, 1))
+        self.buffer.add(self.alex.id, [(cara.id, True), (self.bea.id, True)])
+        cara.delete()
+        self.buffer.flush()
+
+        self.assertEqual(
+            list(Swipe.objects.values_list('swiped_id', flat=True)), [self.bea.id])
+
+    def test_failed_flushes_are_retried_then_dropped(self):
+        self.buffer.add(self.alex.id, [(self.bea.id, True)])
+        with mock.patch('users.swipes.write_swipes', side_effect=RuntimeError('down')):
+            for _ in range(SWIPE_FLUSH_ATTEMPTS):
+                with self.assertRaises(RuntimeError):
+                    self.buffer.flush()
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertFalse(Swipe.objects.exists())
+
+    def test_unknown_users_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.alex)
+        response = client.post(reverse('swipes'), {'swipes': [
+            {'user_id': self.bea.id, 'liked': True},
+            {'user_id': self.bea.id + 1000, 'liked': True},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        with mock.patch('users.views.swipe_buffer') as swipe_buffer:
+            response = client.post(reverse('swipes'), {'swipes': [
+                {'user_id': self.bea.id, 'liked': True}]}, format='json')
+        self.assertEqual(response.status_code, 202)
+        swipe_buffer.add.assert_called_once_with(self.alex.id, [(self.bea.id, True)])
+
+
+class CanonicalMatchesMigrationTests(TransactionTestCase):
+    before = [('users', '0001_initial')]
+    after = [('users', '0002_canonical_matches')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate(self.before)
+        self.executor.loader.build_graph()
+
+    def tearDown(self):
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.executor.loader.graph.leaf_nodes())
+
+    def test_pairs_are_deduplicated_and_backfilled(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        OldUser, OldMatch = apps.get_model('users', 'User'), apps.get_model('users', 'Match')
+        alex, bea, cara = (OldUser.objects.create(username=name, email=f'{name}@example.com')
+                           for name in ('alex', 'bea', 'cara'))
+        oldest = OldMatch.objects.create(user1=bea, user2=alex)
+        OldMatch.objects.create(user1=alex, user2=bea)
+        OldMatch.objects.create(user1=bea, user2=alex)
+        OldMatch.objects.create(user1=cara, user2=cara)
+        other = OldMatch.objects.create(user1=alex, user2=cara)
+        OldMatch.objects.filter(id=oldest.id).update(matched_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+        self.executor.loader.build_graph()
+        self.executor.migrate(self.after)
+
+        apps = self.executor.loader.project_state(self.after).apps
+        NewMatch, NewEdge = apps.get_model('users', 'Match'), apps.get_model('users', 'MatchEdge')
+        self.assertEqual(
+            set(NewMatch.objects.values_list('id', 'user1_id', 'user2_id')),
+            {(oldest.id, alex.id, bea.id), (other.id, alex.id, cara.id)})
+        self.assertEqual(
+            set(NewEdge.objects.values_list('match_id', 'user_id', 'other_id')),
+            {(oldest.id, alex.id, bea.id), (oldest.id, bea.id, alex.id),
+             (other.id, alex.id, cara.id), (other.id, cara.id, alex.id)})
+
+
+class BloomFilterTests(TestCase):
+    # past 2**32 too, where both sides mask the id
+    ids = [1, 2, 3, 97, 1000, 65535, 65537, 123456, 2 ** 31 - 1, 2 ** 31 + 5, 2 ** 33 + 7]
+
+    def test_sql_membership_matches_python(self):
+        User.objects.bulk_create(
+            User(id=user_id, username=f'user{user_id}', email=f'user{user_id}@example.com')
+            for user_id in self.ids)
+        for members in (self.ids[::2], self.ids[1::3], [self.ids[-1]]):
+            bloom = BloomFilter()
+            bloom.update(members)
+            in_sql = dict(User.objects.annotate(
+                seen=contains_expression(bloom.to_bytes())).values_list('id', 'seen'))
+            self.assertEqual(in_sql, {user_id: int(user_id in bloom) for user_id in self.ids})
+
+    def test_membership_is_the_bits_of_bit_positions(self):
+        bloom = BloomFilter()
+        bloom.add(self.ids[4])
+        self.assertEqual(
+            [pos for pos in range(len(bloom.bits) * 8) if bloom.bits[pos >> 3] >> (pos & 7) & 1],
+            sorted(set(bit_positions(self.ids[4]))))
+
+    def test_record_seen_counts_new_ids_only(self):
+        user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        record_seen(user.id, [2, 3])
+        record_seen(user.id, [3, 4])
+        record_seen(user.id, [2, 4])
+
+        seen = SeenFilter.objects.get(user=user)
+        self.assertEqual(seen.count, 3)
+        self.assertEqual([user_id in BloomFilter(seen.bits) for user_id in (2, 3, 4)],
+                         [True, True, True])
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TwoTierCache('test_cache', ttl=60, local_size=8, local_ttl=60)
+        self.cache.shared.clear()
+        # as outside a transaction, without the database
+        patcher = mock.patch('users.caching.transaction.on_commit', lambda func: func())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_invalidate_clears_both_tiers(self):
+        self.cache.fill(1, 'old')
+        self.assertEqual(self.cache.local.get(1), 'old')
+        self.assertEqual(self.cache.shared.get('test_cache:1'), 'old')
+
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.local.get(1))
+        self.assertIsNone(self.cache.get(1))
+
+    def test_invalidated_key_refuses_a_stale_fill(self):
+        self.cache.fill(1, 'old')
+        self.cache.invalidate(1)
+        # a reader that loaded the row before the write
+        self.cache.fill(1, 'old')
+        self.assertIsNone(self.cache.get(1))
+
+    def test_other_processes_see_the_invalidation_once_their_copy_expires(self):
+        other = TwoTierCache('test_cache', ttl=60, local_size=8, local_ttl=60)
+        self.cache.fill(1, 'old')
+        self.assertEqual(other.get(1), 'old')
+
+        self.cache.invalidate(1)
+        other.clear_local()
+        self.assertIsNone(other.get(1))
+
+
+class CacheInvalidationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('get_profile', args=[self.user.id])
+
+    def assertNotCached(self, cache, key):
+        self.assertIsNone(cache.local.get(key))
+        self.assertIsNone(cache.get(key))
+
+    def test_profile_save_and_delete_invalidate_the_profile_cache(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(profile_cache.local.get(self.user.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.bio = 'Updated'
+            self.user.profile.save()
+        self.assertNotCached(profile_cache, self.user.id)
+        self.assertEqual(self.client.get(self.url, {'fields': 'bio'}).data, {'bio': 'Updated'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.profile.delete()
+        self.assertNotCached(profile_cache, self.user.id)
+
+    def test_user_save_invalidates_both_caches(self):
+        self.client.get(self.url)
+        cache_user(self.user)
+        self.assertIsNotNone(get_cached_user(self.user.id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Alexander'
+            self.user.save()
+        self.assertNotCached(user_cache, self.user.id)
+        self.assertNotCached(profile_cache, self.user.id)
+        response = self.client.get(self.url, {'expand': 'user_details'})
+        self.assertEqual(response.data['user_details']['first_name'], 'Alexander')
+
+    def test_user_delete_invalidates_both_caches(self):
+        self.client.get(self.url)
+        cache_user(self.user)
+        user_id = self.user.id
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertNotCached(user_cache, user_id)
+        self.assertNotCached(profile_cache, user_id)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class TokenLoginTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.user.set_password('right password')
+        self.user.save()
+        # never flushed by age while a test runs
+        self.bookkeeping = LoginBookkeeping(flush_interval=3600)
+        for target, value in [('users.login.login_bookkeeping', self.bookkeeping),
+                              ('users.throttling.buckets', LocalBuckets())]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def login(self, password, email='Alex@example.com'):
+        return Client().post(reverse('token_login'), {'email': email, 'password': password},
+                             content_type='application/json')
+
+    def test_login_returns_tokens_and_buffers_bookkeeping(self):
+        response = self.login('right password')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['user']['email'], 'alex@example.com')
+        self.assertEqual(AccessToken(body['tokens']['access'])['user_id'], self.user.id)
+        # nothing written until the buffer is flushed
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertIsNone(User.objects.get(id=self.user.id).last_login)
+
+        self.assertEqual(self.bookkeeping.flush(), 1)
+        self.assertEqual(OutstandingToken.objects.get().user_id, self.user.id)
+        self.assertIsNotNone(User.objects.get(id=self.user.id).last_login)
+
+    def test_wrong_password_is_rejected(self):
+        response = self.login('wrong password')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.bookkeeping.flush(), 0)
+
+    def test_unknown_and_inactive_users_are_rejected(self):
+        self.assertEqual(self.login('right password', email='nobody@example.com').status_code, 401)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertEqual(self.login('right password').status_code, 401)
+        self.assertEqual(self.bookkeeping.flush(), 0)
+
+    def test_attempts_are_throttled_per_account(self):
+        statuses = [self.login('wrong password').status_code for _ in range(11)]
+        self.assertEqual(statuses[:10], [401] * 10)
+        self.assertEqual(statuses[10], 429)
+
+        response = self.login('right password')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.bookkeeping.flush(), 0)
+
+    def test_invalid_body_is_rejected(self):
+        response = Client().post(reverse('token_login'), {'email': 'alex@example.com'},
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PaginationTests(SimpleTestCase):
+    def test_cursor_round_trips(self):
+        for last_id in (1, 42, 2 ** 40):
+            self.assertEqual(decode_cursor(encode_cursor(last_id)), last_id)
+        self.assertIsNone(decode_cursor(None))
+        self.assertIsNone(decode_cursor(''))
+
+    def test_malformed_params_are_rejected(self):
+        for query in ('cursor=not-a-cursor', f'cursor={encode_cursor(1)[:-1]}x', 'limit=0', 'limit=ten'):
+            with self.assertRaises(ValueError):
+                get_page_params(QueryDict(query))
+
+    def test_page_params(self):
+        self.assertEqual(get_page_params(QueryDict()), (20, None))
+        self.assertEqual(get_page_params(QueryDict(f'limit=5&cursor={encode_cursor(7)}')), (5, 7))
+        self.assertEqual(get_page_params(QueryDict('limit=100000')), (MAX_PAGE_SIZE, None))
+
+
+class PotentialMatchesPaginationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.candidates = [
+            make_user(f'candidate{i}@example.com', 'female', 'male', date(1995, 1, 1)).id
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_walks_every_candidate_once(self):
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            response = self.client.get(reverse('potential_matches'), params)
+            self.assertEqual(response.status_code, 200)
+            seen += [match['id'] for match in response.data['potential_matches']]
+            pages += 1
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+            self.assertEqual(decode_cursor(cursor), seen[-1])
+
+        self.assertEqual(seen, sorted(self.candidates))
+        self.assertEqual(pages, 3)
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(reverse('potential_matches'), {'cursor': '!!'})
+        self.assertEqual(response.status_code, 400)
+
+
+def scoring_row(user_id, birthdate, **values):
+    masks, choice_codes = encode_profile_fields(values)
+    return (user_id, birthdate, masks['interests_bits'], masks['love_languages_bits'], choice_codes)
+
+
+def reference_score(requester, candidate, today):
+    """score_batch for one pair, written out value by value"""
+    (_, requester_birthdate, requester_values), (_, birthdate, values) = requester, candidate
+    score = sum(weight for field, weight in CHOICE_FIELD_WEIGHTS.items()
+                if requester_values.get(field) and requester_values.get(field) == values.get(field))
+    for field, weight in (('interests', INTERESTS_WEIGHT), ('love_languages', LOVE_LANGUAGES_WEIGHT)):
+        mine, theirs = set(requester_values.get(field, ())), set(values.get(field, ()))
+        if mine | theirs:
+            score += weight * len(mine & theirs) / len(mine | theirs)
+    if birthdate is None:
+        gap = MAX_AGE_GAP
+    else:
+        gap = abs((today - birthdate).days - (today - requester_birthdate).days) / 365.25
+    return score - AGE_WEIGHT * min(gap, MAX_AGE_GAP) / MAX_AGE_GAP
+
+
+class ScoringTests(SimpleTestCase):
+    today = date(2026, 1, 1)
+    requester = (1, date(1994, 6, 1), {
+        'interests': ['books', 'travel', 'cooking'], 'love_languages': ['words'],
+        'relationship_goals': 'long_term', 'family_plans': 'want_children', 'religion': None})
+    candidates = [
+        (2, date(1995, 1, 1), {'interests': ['books', 'travel'], 'relationship_goals': 'long_term'}),
+        (3, date(1980, 1, 1), {'interests': ['dance'], 'family_plans': 'want_children'}),
+        (4, None, {'love_languages': ['words'], 'religion': None}),
+        (5, date(1994, 6, 1), {}),
+        (6, date(1993, 2, 3), {'interests': ['books', 'travel', 'cooking'], 'love_languages': ['words'],
+                               'relationship_goals': 'long_term', 'family_plans': 'want_children'}),
+    ]
+
+    def batch(self, profiles):
+        return encode_rows([scoring_row(user_id, birthdate, **values)
+                            for user_id, birthdate, values in profiles], self.today)
+
+    def test_scores_match_the_reference(self):
+        scores = score_batch(self.batch([self.requester]), self.batch(self.candidates))
+        expected = [reference_score(self.requester, candidate, self.today)
+                    for candidate in self.candidates]
+        np.testing.assert_allclose(scores, expected, rtol=1e-5, atol=1e-5)
+
+    def test_top_k_is_the_best_first_prefix_of_a_full_sort(self):
+        scores = np.random.default_rng(0).normal(size=1000).astype(np.float32)
+        for k in (1, 5, 1000, 2000):
+            self.assertEqual(list(top_k(scores, k)), list(np.argsort(-scores, kind='stable')[:k]))
+        self.assertEqual(len(top_k(scores, 0)), 0)
+        self.assertEqual(len(top_k(np.empty(0, dtype=np.float32))), 0)
+
+
+class TopFiveTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1),
+                              interests=['books', 'travel', 'cooking'], relationship_goals='long_term')
+        fields = [
+            {},
+            {'interests': ['books']},
+            {'interests': ['books', 'travel']},
+            {'interests': ['books', 'travel'], 'relationship_goals': 'long_term'},
+            {'interests': ['books', 'travel', 'cooking'], 'relationship_goals': 'long_term'},
+            # no overlap and ten years older: last
+            {'interests': ['dance']},
+        ]
+        self.candidates = [
+            make_user(f'candidate{i}@example.com', 'female', 'male',
+                      date(1984, 6, 1) if i == 5 else date(1994, 6, 1), **profile_fields).id
+            for i, profile_fields in enumerate(fields)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_candidates_are_ranked_best_first(self):
+        ranked = rank_candidates(self.user, get_candidate_users(self.user))
+        self.assertEqual([user_id for user_id, _ in ranked],
+                         [self.candidates[i] for i in (4, 3, 2, 1, 0)])
+        scores = [score for _, score in ranked]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_capped_pool_keeps_the_most_recently_active(self):
+        now = datetime.now(timezone.utc)
+        for hours, i in enumerate((1, 4, 2)):
+            User.objects.filter(id=self.candidates[i]).update(last_login=now - timedelta(hours=hours))
+        with mock.patch('users.scoring.MAX_SCORED_CANDIDATES', 3), \
+                self.assertLogs('users.scoring', 'WARNING'):
+            ranked = rank_candidates(self.user, get_candidate_users(self.user))
+        # 0, 3 and 5 never logged in, so are left out despite 3 outscoring 2 and 1
+        self.assertEqual([user_id for user_id, _ in ranked],
+                         [self.candidates[i] for i in (4, 2, 1)])
+
+    def test_top_five_is_computed_once_and_then_served_stored(self):
+        response = self.client.get(reverse('top_five'))
+        self.assertEqual(response.status_code, 200)
+        expected = [self.candidates[i] for i in (4, 3, 2, 1, 0)]
+        self.assertEqual([pick['id'] for pick in response.data['top_five']], expected)
+        self.assertTrue(TopFive.objects.filter(user=self.user).exists())
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('top_five'))
+        self.assertEqual([pick['id'] for pick in response.data['top_five']], expected)
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    dlat, dlon = math.radians(lat2 - lat1), math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + \
+        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2
+    return 2 * 3958.8 * math.asin(min(math.sqrt(a), 1.0))
+
+
+class GeohashTests(SimpleTestCase):
+    def test_known_geohash(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744), 'u4pruyd')
+        self.assertEqual(encode_geohash(57.64911, 10.40744, precision=11), 'u4pruydqqvj')
+        self.assertEqual(cell_size_degrees(1), (45.0, 45.0))
+
+    def test_covering_cells_contain_the_whole_circle(self):
+        for latitude, longitude, radius in [(40.7128, -74.0060, 1), (40.7128, -74.0060, 25),
+                                            (64.1466, -21.9426, 100), (0.0, 179.99, 10)]:
+            cells = covering_cells(latitude, longitude, radius)
+            for step in range(72):
+                bearing = math.radians(step * 5)
+                # a point just inside the circle in this direction
+                lat = latitude + 0.999 * radius / 69.0 * math.cos(bearing)
+                lon = longitude + 0.999 * radius / (69.0 * math.cos(math.radians(lat))) * math.sin(bearing)
+                lon = (lon + 180.0) % 360.0 - 180.0
+                if haversine_miles(latitude, longitude, lat, lon) > radius:
+                    continue
+                geohash = encode_geohash(lat, lon)
+                self.assertTrue(any(geohash.startswith(cell) for cell in cells),
+                                (latitude, longitude, radius, lat, lon))
+
+    def test_huge_radius_has_no_cells(self):
+        self.assertIsNone(covering_cells(40.7128, -74.0060, 10000))
+
+
+class DistanceFilterTests(TestCase):
+    places = {
+        'New York': (40.7128, -74.0060),
+        'Hoboken': (40.7440, -74.0324),
+        'Philadelphia': (39.9526, -75.1652),
+        'Boston': (42.3601, -71.0589),
+    }
+
+    def setUp(self):
+        City.objects.bulk_create(
+            City(name=name, search_name=City.normalize(name), country='US',
+                 latitude=latitude, longitude=longitude)
+            for name, (latitude, longitude) in self.places.items())
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1), max_distance=100)
+        self.nearby = {name: make_user(f'{name.lower().replace(" ", "")}@example.com', 'female', 'male',
+                                       date(1995, 1, 1), location=name).id
+                       for name in self.places}
+
+    def test_candidates_within_max_distance(self):
+        candidates = set(get_candidate_users(self.user).values_list('id', flat=True))
+        self.assertEqual(candidates, {self.nearby[name] for name in ('New York', 'Hoboken', 'Philadelphia')})
+
+    def test_candidates_own_max_distance_must_reach_the_requester(self):
+        Profile.objects.filter(user_id=self.nearby['Philadelphia']).update(max_distance=50)
+        Profile.objects.filter(user_id=self.nearby['Hoboken']).update(max_distance=5)
+        candidates = set(get_candidate_users(self.user).values_list('id', flat=True))
+        self.assertEqual(candidates, {self.nearby['New York'], self.nearby['Hoboken']})
+
+    def test_profiles_are_placed_and_sql_distance_matches_haversine(self):
+        latitude, longitude = self.places['New York']
+        distances = dict(Profile.objects.filter(user_id__in=self.nearby.values()).annotate(
+            distance=distance_expression(latitude, longitude)).values_list('user_id', 'distance'))
+        for name, user_id in self.nearby.items():
+            profile = Profile.objects.get(user_id=user_id)
+            self.assertEqual(profile.geohash, encode_geohash(*self.places[name]))
+            self.assertAlmostEqual(distances[user_id], haversine_miles(latitude, longitude, *self.places[name]),
+                                   places=6)
+
+
+class TopFivePrecomputeTests(TestCase):
+    def setUp(self):
+        self.users = [make_user(f'man{i}@example.com', 'male', 'female', date(1994, 6, 1)) for i in range(2)]
+        self.candidates = [make_user(f'woman{i}@example.com', 'female', 'male', date(1995, 1, 1))
+                           for i in range(3)]
+
+    def test_chunk_matches_picks_computed_one_by_one(self):
+        results = dict(compute_chunk([user.id for user in self.users]))
+        self.assertEqual(results, {user.id: compute_picks(user) for user in self.users})
+        self.assertEqual([pick['id'] for pick in results[self.users[0].id]],
+                         [candidate.id for candidate in self.candidates])
+
+    def test_saving_picks_again_replaces_them(self):
+        user = self.users[0]
+        save_picks([(user.id, compute_picks(user))])
+        later = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        save_picks([(user.id, [])], computed_at=later)
+
+        top_five = TopFive.objects.get(user=user)
+        self.assertEqual((top_five.picks, top_five.computed_at), ([], later))
+
+
+class ComputeTopFiveCommandTests(TransactionTestCase):
+    def test_command_computes_picks_in_worker_processes(self):
+        users = [make_user(f'man{i}@example.com', 'male', 'female', date(1994, 6, 1)) for i in range(3)]
+        candidate = make_user('woman@example.com', 'female', 'male', date(1995, 1, 1))
+        User.objects.filter(id=users[0].id).update(last_login=datetime.now(timezone.utc))
+
+        call_command('compute_top_five', workers=2, chunk_size=1, stdout=StringIO())
+        self.assertEqual(list(TopFive.objects.values_list('user_id', flat=True)), [users[0].id])
+
+        call_command('compute_top_five', workers=2, chunk_size=1, active_days=0, stdout=StringIO())
+        picks = dict(TopFive.objects.values_list('user_id', 'picks'))
+        self.assertEqual(set(picks), {user.id for user in users} | {candidate.id})
+        self.assertEqual([pick['id'] for pick in picks[users[1].id]], [candidate.id])
+
+    def test_changed_only_skips_unchanged_profiles(self):
+        changed, unchanged = (make_user(f'man{i}@example.com', 'male', 'female', date(1994, 6, 1))
+                              for i in range(2))
+        call_command('compute_top_five', workers=1, active_days=0, stdout=StringIO())
+        computed_at = dict(TopFive.objects.values_list('user_id', 'computed_at'))
+
+        changed.profile.bio = 'Updated'
+        changed.profile.save()
+        call_command('compute_top_five', workers=1, active_days=0, changed_only=True, stdout=StringIO())
+        recomputed = dict(TopFive.objects.values_list('user_id', 'computed_at'))
+        self.assertGreater(recomputed[changed.id], computed_at[changed.id])
+        self.assertEqual(recomputed[unchanged.id], computed_at[unchanged.id])
+
+
+class FieldsetTests(SimpleTestCase):
+    allowed = ['id', 'bio', 'gender', 'prompts']
+    expandable = ['prompts']
+
+    def parse(self, query):
+        return parse_fieldset(QueryDict(query), self.allowed, self.expandable)
+
+    def test_fields_and_expand(self):
+        self.assertIsNone(self.parse(''))
+        self.assertEqual(self.parse('fields=id, bio'), {'id', 'bio'})
+        self.assertEqual(self.parse('expand=prompts'), {'id', 'bio', 'gender', 'prompts'})
+        self.assertEqual(self.parse('fields=id&expand=prompts'), {'id', 'prompts'})
+
+    def test_unknown_names_are_rejected(self):
+        for query in ('fields=password', 'fields=prompts', 'expand=bio'):
+            with self.assertRaises(ValueError):
+                self.parse(query)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1), bio='Hi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_user_fields(self):
+        response = self.client.get(reverse('user_by_id', args=[self.user.id]), {'fields': 'id,email'})
+        self.assertEqual(response.data, {'id': self.user.id, 'email': 'alex@example.com'})
+        response = self.client.get(reverse('user_by_id', args=[self.user.id]), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_profile_fields(self):
+        url = reverse('get_profile', args=[self.user.id])
+        response = self.client.get(url, {'fields': 'bio,gender'})
+        self.assertEqual(response.data, {'bio': 'Hi', 'gender': 'male'})
+        response = self.client.get(url, {'fields': 'bio', 'expand': 'user_details'})
+        self.assertEqual(set(response.data), {'bio', 'user_details'})
+        self.assertEqual(response.data['user_details']['email'], 'alex@example.com')
+        self.assertNotIn('user_details', self.client.get(url).data)
+        self.assertEqual(self.client.get(url, {'fields': 'nope'}).status_code, 400)
+
+    def test_only_requested_columns_are_loaded(self):
+        full = ProfileSerializer(Profile.objects.get(user=self.user)).data
+        for fields in ({'bio'}, {'bio', 'gender', 'picture_urls'}, {'bio', 'user_details'}):
+            with self.assertNumQueries(1):
+                profile = profile_read_queryset(fields).get(user=self.user)
+                data = serialize_profile(profile, fields)
+            self.assertEqual(data, {name: full[name] for name in full if name in fields})
+            self.assertIn('interests', profile.get_deferred_fields())
+
+
+class BatchProfilesTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.others = [make_user(f'user{i}@example.com', 'female', 'male', date(1995, 1, 1), bio=f'Bio {i}')
+                       for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, ids, **params):
+        return self.client.get(reverse('profiles'), {'ids': ','.join(map(str, ids)), **params})
+
+    def test_profiles_keep_request_order_in_one_query(self):
+        ids = [self.others[2].id, self.others[0].id, self.others[2].id, self.others[1].id]
+        with self.assertNumQueries(1):
+            response = self.get(ids, fields='bio')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'profiles': [{'bio': 'Bio 2'}, {'bio': 'Bio 0'}, {'bio': 'Bio 1'}],
+            'not_found': [],
+        })
+
+    def test_profiles_match_get_profile(self):
+        response = self.get([other.id for other in self.others])
+        for other, profile in zip(self.others, response.data['profiles']):
+            self.assertEqual(profile, self.client.get(reverse('get_profile', args=[other.id])).data)
+
+    def test_missing_and_inactive_users_are_not_found(self):
+        inactive = self.others[0]
+        User.objects.filter(id=inactive.id).update(is_active=False)
+        missing = self.others[-1].id + 1000
+
+        response = self.get([inactive.id, self.others[1].id, missing], fields='id')
+        self.assertEqual(response.data['not_found'], [inactive.id, missing])
+        self.assertEqual(len(response.data['profiles']), 1)
+
+        self.user.is_staff = True
+        response = self.get([inactive.id, missing], fields='id')
+        self.assertEqual(response.data['not_found'], [missing])
+
+    def test_single_profile_hides_inactive_users_too(self):
+        inactive = self.others[0]
+        url = reverse('get_profile', args=[inactive.id])
+        # cached while still active
+        self.assertEqual(self.client.get(url).status_code, 200)
+        inactive.is_active = False
+        inactive.save()
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.get([inactive.id], fields='id').data['not_found'], [inactive.id])
+        self.user.is_staff = True
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('profiles'), {'ids': '1,x'}).status_code, 400)
+        self.assertEqual(self.get(range(1, MAX_PROFILES_PER_REQUEST + 2)).status_code, 400)
+        self.assertEqual(self.get([self.others[0].id], fields='nope').status_code, 400)
+
+
+class ConditionalRequestTests(SimpleTestCase):
+    def request(self, **headers):
+        return RequestFactory().get('/', **headers)
+
+    def test_if_none_match(self):
+        etag = make_etag(3)
+        self.assertEqual(etag, '"3"')
+        self.assertFalse(if_none_match(self.request(), etag))
+        self.assertTrue(if_none_match(self.request(HTTP_IF_NONE_MATCH='"3"'), etag))
+        self.assertTrue(if_none_match(self.request(HTTP_IF_NONE_MATCH='"1", W/"3"'), etag))
+        self.assertTrue(if_none_match(self.request(HTTP_IF_NONE_MATCH='*'), etag))
+        self.assertFalse(if_none_match(self.request(HTTP_IF_NONE_MATCH='"4"'), etag))
+
+    def test_if_match(self):
+        etag = make_etag(3)
+        self.assertFalse(if_match_fails(self.request(), etag))
+        self.assertFalse(if_match_fails(self.request(), None))
+        self.assertFalse(if_match_fails(self.request(HTTP_IF_MATCH='"3"'), etag))
+        self.assertFalse(if_match_fails(self.request(HTTP_IF_MATCH='W/"3"'), etag))
+        self.assertTrue(if_match_fails(self.request(HTTP_IF_MATCH='"2"'), etag))
+        self.assertFalse(if_match_fails(self.request(HTTP_IF_MATCH='*'), etag))
+        self.assertTrue(if_match_fails(self.request(HTTP_IF_MATCH='*'), None))
+        self.assertTrue(if_match_fails(self.request(HTTP_IF_MATCH='"3"'), None))
+
+
+class MessagePackTests(SimpleTestCase):
+    data = {
+        'id': 7, 'name': 'Zoë', 'score': 1.5, 'tags': ['a', 'b'], 'none': None,
+        'born': date(1994, 6, 1), 'at': datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+        'amount': Decimal('9.99'), 'uuid': uuid.UUID(int=1), 'nested': {'ok': True},
+    }
+
+    def test_renders_what_json_renders(self):
+        packed = MessagePackRenderer().render(self.data)
+        self.assertEqual(msgpack.unpackb(packed), json.loads(JSONRenderer().render(self.data)))
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    def test_round_trip(self):
+        data = {'bio': 'Hi', 'interests': ['books'], 'max_distance': 25, 'photo': b'\xff\x00'}
+        packed = MessagePackRenderer().render(data)
+        self.assertEqual(MessagePackParser().parse(BytesIO(packed)), data)
+
+    def test_malformed_body_is_a_parse_error(self):
+        for body in (b'\xc1', msgpack.packb(1) + b'\x01', msgpack.packb([1, 2])[:-1]):
+            with self.assertRaises(ParseError):
+                MessagePackParser().parse(BytesIO(body))
+
+
+class MessagePackEndpointTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_profile_update_and_read_in_msgpack(self):
+        response = self.client.patch(
+            reverse('update_profile', args=[self.user.id]), msgpack.packb({'bio': 'Packed'}),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['bio'], 'Packed')
+
+        url = reverse('get_profile', args=[self.user.id])
+        response = self.client.get(url, {'format': 'msgpack'})
+        self.assertEqual(msgpack.unpackb(response.content), self.client.get(url).json())
+
+
+class BitsetTests(SimpleTestCase):
+    def test_mask_round_trip(self):
+        values = ['gaming', 'books', 'hiking']
+        self.assertEqual(from_mask('interests', to_mask('interests', values)), ['books', 'gaming', 'hiking'])
+        self.assertEqual(to_mask('interests', ['not_a_choice', None]), 0)
+
+    def test_candidate_filters(self):
+        self.assertEqual(parse_candidate_filters(QueryDict()), (0, {}))
+        self.assertEqual(
+            parse_candidate_filters(QueryDict('min_shared_interests=2&exclude_religion=islam, judaism'
+                                              '&exclude_interests=gaming&limit=5')),
+            (2, {'religion': ['islam', 'judaism'], 'interests': ['gaming']}))
+        for query in ('min_shared_interests=x', 'min_shared_interests=-1',
+                      'exclude_height=1', 'exclude_religion=nope'):
+            with self.assertRaises(ValueError):
+                parse_candidate_filters(QueryDict(query))
+
+
+class BitsetQueryTests(TestCase):
+    profiles = [
+        {'interests': ['books', 'travel', 'cooking'], 'religion': 'islam'},
+        {'interests': ['books', 'gaming'], 'religion': 'judaism'},
+        {'interests': ['hiking'], 'religion': 'buddhism'},
+        {'interests': [], 'religion': 'prefer_not_to_say'},
+        {'interests': ['books', 'travel', 'cooking', 'gaming', 'hiking', 'music']},
+    ]
+
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1),
+                              interests=['books', 'travel', 'gaming'])
+        self.ids = [make_user(f'user{i}@example.com', 'female', 'male', date(1995, 1, 1), **fields).id
+                    for i, fields in enumerate(self.profiles)]
+
+    def test_sql_popcount_matches_python(self):
+        masks = dict(Profile.objects.filter(user_id__in=self.ids).values_list('user_id', 'interests_bits'))
+        for values in (['books'], ['books', 'travel', 'gaming'], [], ['music', 'hiking', 'dance']):
+            mask = to_mask('interests', values)
+            in_sql = dict(Profile.objects.filter(user_id__in=self.ids).annotate(
+                shared=shared_count('interests', mask)).values_list('user_id', 'shared'))
+            self.assertEqual(in_sql, {user_id: bin(bits & mask).count('1') for user_id, bits in masks.items()})
+            self.assertEqual(
+                [in_sql[user_id] for user_id in self.ids],
+                list(popcount_array(np.array([masks[user_id] for user_id in self.ids]) & mask)))
+
+    def test_sql_dealbreakers_match_python(self):
+        profiles = Profile.objects.filter(user_id__in=self.ids)
+        kept = set(exclude_choices(profiles, 'religion', ['islam', 'judaism']).values_list('user_id', flat=True))
+        self.assertEqual(kept, {user_id for user_id, fields in zip(self.ids, self.profiles)
+                                if fields.get('religion') not in ('islam', 'judaism')})
+        kept = set(exclude_any(profiles, 'interests', ['gaming', 'hiking']).values_list('user_id', flat=True))
+        self.assertEqual(kept, {user_id for user_id, fields in zip(self.ids, self.profiles)
+                                if not {'gaming', 'hiking'} & set(fields['interests'])})
+
+    def test_candidates_are_filtered_in_sql(self):
+        candidates = list(get_candidate_users(self.user, min_shared_interests=2).values_list('id', flat=True))
+        self.assertEqual(candidates, [self.ids[0], self.ids[1], self.ids[4]])
+        candidates = list(get_candidate_users(
+            self.user, min_shared_interests=1,
+            dealbreakers={'religion': ['judaism'], 'interests': ['music']}).values_list('id', flat=True))
+        self.assertEqual(candidates, [self.ids[0]])
+
+    def test_potential_matches_filters(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('potential_matches'),
+                              {'min_shared_interests': 2, 'exclude_religion': 'islam'})
+        self.assertEqual([match['id'] for match in response.data['potential_matches']],
+                         [self.ids[1], self.ids[4]])
+        response = client.get(reverse('potential_matches'), {'exclude_religion': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+def outstanding_token(user, jti, expires_in, blacklisted=False):
+    now = datetime.now(timezone.utc)
+    token = OutstandingToken.objects.create(
+        user=user, jti=jti, token=jti, created_at=now, expires_at=now + timedelta(seconds=expires_in))
+    if blacklisted:
+        BlacklistedToken.objects.create(token=token)
+    return token
+
+
+class BlacklistFilterTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        outstanding_token(self.user, 'revoked', 3600, blacklisted=True)
+        # the background builder's own connection cannot see this test's rows
+        patcher = mock.patch.object(BlacklistFilter, '_ensure_builder')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def built_filter(self, sync_interval=3600):
+        blacklist = BlacklistFilter(sync_interval=sync_interval, rebuild_interval=3600)
+        blacklist._build()
+        # the first check after a build syncs once
+        blacklist.might_contain('warm-up')
+        return blacklist
+
+    def test_unbuilt_filter_defers_to_the_database(self):
+        blacklist = BlacklistFilter(sync_interval=0, rebuild_interval=3600)
+        self.assertTrue(blacklist.might_contain('anything'))
+
+    def test_unlisted_token_is_checked_without_a_query(self):
+        blacklist = self.built_filter()
+        token, _ = RefreshToken.for_user_unrecorded(self.user)
+        with mock.patch('users.tokens.blacklist_filter', blacklist), self.assertNumQueries(0):
+            self.assertFalse(blacklist.might_contain('never-issued'))
+            token.check_blacklist()
+
+        self.assertTrue(blacklist.might_contain('revoked'))
+        with mock.patch('users.tokens.blacklist_filter', blacklist):
+            token.payload['jti'] = 'revoked'
+            with self.assertRaises(TokenError):
+                token.check_blacklist()
+
+    def test_blacklisting_elsewhere_is_seen_after_sync_or_rebuild(self):
+        synced, stale = self.built_filter(sync_interval=0), self.built_filter()
+        outstanding_token(self.user, 'revoked-later', 3600, blacklisted=True)
+
+        self.assertTrue(synced.might_contain('revoked-later'))
+        self.assertFalse(stale.might_contain('revoked-later'))
+        stale._build()
+        self.assertTrue(stale.might_contain('revoked-later'))
+
+    def test_rebuild_drops_expired_tokens(self):
+        outstanding_token(self.user, 'expired', -1, blacklisted=True)
+        self.assertFalse(self.built_filter().might_contain('expired'))
+
+    def test_sync_does_not_hold_the_lock_during_the_query(self):
+        blacklist = self.built_filter(sync_interval=0)
+        queried = []
+
+        def rows(*args):
+            queried.append(blacklist._lock.locked())
+            return []
+        with mock.patch('users.tokens.BlacklistedToken.objects.filter') as query:
+            query.return_value.values_list.side_effect = rows
+            blacklist.might_contain('anything')
+        self.assertEqual(queried, [False])
+
+
+class CompactTokensTests(TestCase):
+    def test_only_expired_tokens_are_deleted_in_batches(self):
+        user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        live = [outstanding_token(user, f'live{i}', 3600, blacklisted=i % 2 == 0).id for i in range(3)]
+        for i in range(5):
+            outstanding_token(user, f'expired{i}', -60, blacklisted=i % 2 == 0)
+
+        with mock.patch('users.management.commands.compact_tokens.time.sleep') as sleep:
+            call_command('compact_tokens', batch_size=2, stdout=StringIO())
+        # three batches of at most two expired tokens
+        self.assertEqual(sleep.call_count, 3)
+        self.assertEqual(sorted(OutstandingToken.objects.values_list('id', flat=True)), live)
+        self.assertEqual(sorted(BlacklistedToken.objects.values_list('token_id', flat=True)),
+                         [live[0], live[2]])
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = make_user('alex@example.com', 'male', 'female', date(1994, 6, 1))
+        self.user.set_password('old password')
+        self.user.save()
+
+    def test_password_hash_is_not_cached(self):
+        cache_user(self.user)
+        for cached in (user_cache.local.get(self.user.id),
+                       user_cache.shared.get(user_cache._key(self.user.id))):
+            self.assertNotIn('password', cached.__dict__)
+            self.assertIn('password', cached.get_deferred_fields())
+        self.assertIn('password', self.user.__dict__)
+
+        user = get_cached_user(self.user.id)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('old password'))
+
+    def test_password_change_through_a_cached_user(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        client.get(reverse('matches'))
+        self.assertIsNotNone(get_cached_user(self.user.id))
+
+        response = client.post(reverse('change_password'), {
+            'old_password': 'old password', 'new_password': 'new password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(id=self.user.id).check_password('new password'))
+
+    @override_settings(SIMPLE_JWT={**settings.SIMPLE_JWT, 'CHECK_REVOKE_TOKEN': True})
+    def test_revocation_is_checked_against_the_cached_claim(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(client.get(reverse('matches')).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(reverse('matches')).status_code, 200)
+
+        self.user.set_password('new password')
+        self.user.save()
+        self.assertEqual(client.get(reverse('matches')).status_code, 401)
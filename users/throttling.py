@@ -0,0 +1,144 @@
+"""
+Token-bucket throttling for the endpoints that hash passwords. Every
+request draws from two buckets, one for the client IP and one for the
+account it names, and both must have tokens left. In adaptive mode a
+request costs more IP tokens while password hashing is backed up, so
+clients that retry hard run dry first while everyone else still gets
+through. Account buckets always cost one token: a higher cost there would
+let anyone's traffic lock a victim's account out.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from topfive import metrics
+
+from .hashing import hashing_depth
+
+# (bucket size, tokens added per second)
+Rate = Tuple[float, float]
+# bucket key -> (its rate, tokens to take)
+Costs = Dict[str, Tuple[Rate, float]]
+# buckets kept in memory; the least recently used are dropped (as if full)
+MAX_LOCAL_BUCKETS = 100000
+
+
+def request_cost(capacity: float) -> float:
+    """
+    Tokens a request takes from a bucket of capacity. Capped at half of
+    it: tokens never refill past capacity, so a dearer request could
+    never be paid for. hashing_depth() is per process, so with sync,
+    single-threaded workers this stays at one token.
+    """
+    if not settings.AUTH_THROTTLE_ADAPTIVE:
+        return 1.0
+    return min(capacity / 2, max(1.0, hashing_depth() / settings.LOGIN_HASHER_THREADS))
+
+
+def _refill(bucket: Optional[Tuple[float, float]], rate: Rate, now: float) -> float:
+    capacity, per_second = rate
+    if bucket is None:
+        return capacity
+    tokens, updated = bucket
+    return min(capacity, tokens + (now - updated) * per_second)
+
+
+class LocalBuckets:
+    def __init__(self, max_size: int = MAX_LOCAL_BUCKETS):
+        self.max_size = max_size
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, costs: Costs) -> float:
+        """Take the cost from every bucket, or from none; returns seconds to wait (0 if taken)"""
+        now = time.time()
+        with self._lock:
+            tokens = {key: _refill(self._buckets.get(key), rate, now)
+                      for key, (rate, _) in costs.items()}
+            wait = max((cost - tokens[key]) / rate[1] for key, (rate, cost) in costs.items())
+            if wait > 0:
+                return wait
+            for key, (_, cost) in costs.items():
+                self._buckets[key] = (tokens[key] - cost, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+
+class SharedBuckets:
+    """
+    Buckets in a Django cache, shared by every process. Read-modify-write
+    without a lock, so concurrent requests can both spend the same token;
+    fine for throttling.
+    """
+
+    def __init__(self, alias: str):
+        self.alias = alias
+
+    def take(self, costs: Costs) -> float:
+        cache = caches[self.alias]
+        now = time.time()
+        stored = cache.get_many(list(costs))
+        tokens = {key: _refill(stored.get(key), rate, now)
+                  for key, (rate, _) in costs.items()}
+        wait = max((cost - tokens[key]) / rate[1] for key, (rate, cost) in costs.items())
+        if wait > 0:
+            return wait
+        cache.set_many({key: (tokens[key] - cost, now) for key, (_, cost) in costs.items()},
+                       timeout=max(rate[0] / rate[1] for rate, _ in costs.values()))
+        return 0.0
+
+
+buckets = SharedBuckets(settings.AUTH_THROTTLE_CACHE) \
+    if settings.AUTH_THROTTLE_CACHE else LocalBuckets()
+
+
+def throttle_wait(ip: str, account: Optional[object]) -> float:
+    """Seconds until a request from ip for account may go ahead, 0 if it may now"""
+    ip_rate = settings.AUTH_THROTTLE_RATES['ip']
+    costs = {f'throttle:ip:{ip}': (ip_rate, request_cost(ip_rate[0]))}
+    if account is not None:
+        costs[f'throttle:account:{account}'] = (settings.AUTH_THROTTLE_RATES['account'], 1.0)
+    wait = buckets.take(costs)
+    metrics.incr('auth_throttle.throttled' if wait else 'auth_throttle.allowed')
+    return wait
+
+
+def client_ip(request) -> str:
+    """
+    The client address as DRF throttles see it: REMOTE_ADDR, or with
+    NUM_PROXIES set, the address that many proxies back in X-Forwarded-For
+    """
+    return BaseThrottle().get_ident(request)
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    DRF throttle for password endpoints. The account is the email in the
+    body (login, signup), the user_id in the URL (reset) or the
+    authenticated user (change password).
+    """
+    def get_account(self, request, view) -> Optional[object]:
+        user_id = getattr(view, 'kwargs', {}).get('user_id')
+        if user_id is not None:
+            return user_id
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        try:
+            email = request.data.get('email')
+        except AttributeError:
+            return None
+        return email.lower() if isinstance(email, str) else None
+
+    def allow_request(self, request, view) -> bool:
+        self._wait = throttle_wait(self.get_ident(request), self.get_account(request, view))
+        return not self._wait
+
+    def wait(self) -> Optional[float]:
+        return self._wait
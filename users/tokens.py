@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_FALSE_POSITIVE_RATE = 0.001
+# the filter is sized for at least this many JTIs, and twice what it holds
+BLACKLIST_MIN_CAPACITY = 100000
+# every sync re-reads rows newer than what was visible this long ago, so a
+# blacklisting whose transaction commits late is still picked up
+BLACKLIST_SYNC_OVERLAP = 5.0
+
+_UINT64 = 1 << 64
+
+
+def _hashes(jtis: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    digests = b''.join(hashlib.blake2b(jti.encode(), digest_size=16).digest()
+                       for jti in jtis)
+    halves = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+    return halves[:, 0], halves[:, 1] | np.uint64(1)
+
+
+class _Bits:
+    """A Bloom filter over JTI strings, sized once for a capacity"""
+
+    def __init__(self, capacity: int):
+        m = -capacity * math.log(BLACKLIST_FALSE_POSITIVE_RATE) / math.log(2) ** 2
+        self.size = int(math.ceil(m / 8)) * 8
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8)
+        # writable view for bulk adds
+        self._array = np.frombuffer(self.bits, dtype=np.uint8)
+
+    def add(self, jtis: Iterable[str]) -> None:
+        jtis = list(jtis)
+        if not jtis:
+            return
+        h1, h2 = _hashes(jtis)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        # uint64 arithmetic wraps, the same as the masking in __contains__
+        positions = ((h1[:, None] + steps * h2[:, None]) % np.uint64(self.size)).ravel()
+        np.bitwise_or.at(self._array, positions >> np.uint64(3),
+                         np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+    def __contains__(self, jti: str) -> bool:
+        # single lookups in plain Python; numpy's per-call overhead dominates here
+        digest = hashlib.blake2b(jti.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % _UINT64 % self.size
+            if not self.bits[pos >> 3] >> (pos & 7) & 1:
+                return False
+        return True
+
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter of blacklisted refresh token JTIs, so that
+    checking a token that is not blacklisted (nearly every check) costs no
+    query. It is synced with rows added since the last sync at most every
+    sync_interval seconds, and rebuilt from the unexpired rows every
+    rebuild_interval seconds in a background thread, which also drops
+    compacted tokens. Until the first build finishes every JTI is reported
+    as possibly blacklisted, i.e. checked in the database as before.
+    """
+
+    def __init__(self, sync_interval: float, rebuild_interval: float):
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._bits: Optional[_Bits] = None
+        self._built_at = 0.0
+        self._synced_at = 0.0
+        self._syncing = False
+        # (time, highest row id seen), oldest first, for BLACKLIST_SYNC_OVERLAP
+        self._marks = deque()
+        self._lock = threading.Lock()
+        self._builder = None
+
+    def _build(self) -> None:
+        started = time.monotonic()
+        max_id = BlacklistedToken.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        jtis = list(BlacklistedToken.objects.filter(
+            id__lte=max_id, token__expires_at__gt=timezone.now()
+        ).values_list('token__jti', flat=True).iterator(chunk_size=10000))
+        bits = _Bits(max(BLACKLIST_MIN_CAPACITY, 2 * len(jtis)))
+        bits.add(jtis)
+        with self._lock:
+            self._bits = bits
+            self._built_at = started
+            self._marks = deque([(started, max_id)])
+            # rows added while building are read by the next sync
+            self._synced_at = 0.0
+        logger.info(f"Rebuilt token blacklist filter with {len(jtis)} JTIs "
+                    f"in {time.monotonic() - started:.2f}s")
+
+    def _run_builder(self) -> None:
+        try:
+            self._build()
+        except Exception as e:
+            logger.error(f"Error rebuilding token blacklist filter: {str(e)}")
+        finally:
+            connection.close()
+
+    def _ensure_builder(self) -> None:
+        if self._builder is None or not self._builder.is_alive():
+            self._builder = threading.Thread(
+                target=self._run_builder, name='blacklist-filter', daemon=True)
+            self._builder.start()
+
+    def _sync(self) -> None:
+        now = time.monotonic()
+        if self._syncing or now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if self._syncing or now - self._synced_at < self.sync_interval:
+                return
+            if self._bits is None or now - self._built_at >= self.rebuild_interval:
+                self._ensure_builder()
+            if self._bits is None:
+                return
+            while len(self._marks) > 1 and now - self._marks[1][0] >= BLACKLIST_SYNC_OVERLAP:
+                self._marks.popleft()
+            bits, since, last_id = self._bits, self._marks[0][1], self._marks[-1][1]
+            self._syncing = True
+        # queried without the lock, so a slow database only holds up this
+        # thread; the others keep checking against the filter as it is
+        try:
+            rows = list(BlacklistedToken.objects.filter(id__gt=since).values_list(
+                'id', 'token__jti'))
+        except Exception:
+            self._syncing = False
+            raise
+        with self._lock:
+            bits.add(jti for _, jti in rows)
+            # a rebuild meanwhile set its own marks and syncs again from them
+            if self._bits is bits:
+                self._marks.append((now, max((id for id, _ in rows), default=last_id)))
+                self._synced_at = now
+            self._syncing = False
+
+    def might_contain(self, jti: str) -> bool:
+        self._sync()
+        bits = self._bits
+        return bits is None or jti in bits
+
+    def add(self, jti: str) -> None:
+        """Record a blacklisting done by this process right away"""
+        with self._lock:
+            if self._bits is not None:
+                self._bits.add([jti])
+
+
+blacklist_filter = BlacklistFilter(
+    settings.TOKEN_BLACKLIST_SYNC_INTERVAL, settings.TOKEN_BLACKLIST_REBUILD_INTERVAL)
+
+
+class RefreshToken(tokens.RefreshToken):
+    """simplejwt's RefreshToken with the blacklist check behind blacklist_filter"""
+
+    def check_blacklist(self) -> None:
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if blacklist_filter.might_contain(jti) and \
+                BlacklistedToken.objects.filter(token__jti=jti).exists():
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
+
+    @classmethod
+    def for_user_unrecorded(cls, user) -> Tuple['RefreshToken', OutstandingToken]:
+        """
+        for_user() without writing the token's OutstandingToken row, which is
+        returned unsaved for the caller to insert later (in bulk)
+        """
+        token = super(tokens.BlacklistMixin, cls).for_user(user)
+        outstanding = OutstandingToken(
+            user=user,
+            jti=token[api_settings.JTI_CLAIM],
+            token=str(token),
+            created_at=token.current_time,
+            expires_at=datetime_from_epoch(token['exp']),
+        )
+        return token, outstanding
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
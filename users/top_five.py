@@ -0,0 +1,37 @@
+from typing import List, Sequence, Tuple
+
+from django.utils import timezone
+
+from .matching import get_candidate_users
+from .models import TopFive, User
+from .scoring import rank_candidates
+from .types import MatchData
+from .utils import user_to_match_data
+
+
+def compute_picks(user: User) -> List[MatchData]:
+    """Rank the user's candidate pool and return their top picks, best first"""
+    ranked = rank_candidates(user, get_candidate_users(user))
+    users = User.objects.select_related('profile').only(
+        'id', 'first_name', 'profile__photos'
+    ).in_bulk([user_id for user_id, _ in ranked])
+    return [user_to_match_data(users[user_id])
+            for user_id, _ in ranked if user_id in users]
+
+
+def compute_chunk(user_ids: Sequence[int]) -> List[Tuple[int, List[MatchData]]]:
+    """Compute picks for a chunk of users; run inside a worker process"""
+    users = User.objects.select_related('profile').filter(id__in=user_ids)
+    return [(user.id, compute_picks(user)) for user in users]
+
+
+def save_picks(results: Sequence[Tuple[int, List[MatchData]]], computed_at=None) -> None:
+    """Upsert computed picks, one row per user"""
+    computed_at = computed_at or timezone.now()
+    TopFive.objects.bulk_create(
+        [TopFive(user_id=user_id, picks=picks, computed_at=computed_at)
+         for user_id, picks in results],
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['picks', 'computed_at'],
+    )
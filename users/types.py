@@ -1,4 +1,4 @@
-from typing import List, NotRequired, TypedDict
+from typing import Dict, List, NotRequired, Optional, TypedDict
 from datetime import date
 
 
@@ -24,12 +24,14 @@ class ProfileData(TypedDict, total=False):
     id: NotRequired[int]
     bio: NotRequired[str]
     interests: NotRequired[List[int]]
-    picture_urls: NotRequired[List[str]]
+    # photo slots to remove; photos are added by complete_photo_upload
+    delete_photos: NotRequired[List[int]]
     gender: NotRequired[str]
     location: NotRequired[str]
     preferred_gender: NotRequired[str]
     min_preferred_age: NotRequired[int]
     max_preferred_age: NotRequired[int]
+    max_distance: NotRequired[int]
     phone_number: NotRequired[str]
     height: NotRequired[int]
     pronouns: NotRequired[str]
@@ -42,6 +44,13 @@ class ProfileData(TypedDict, total=False):
     goals: NotRequired[str]
 
 
+class ProfilesResponse(TypedDict):
+    # serialized profiles in the order requested
+    profiles: List[dict]
+    # requested ids that do not exist or are not visible
+    not_found: List[int]
+
+
 class MatchData(TypedDict):
     id: int
     first_name: str
@@ -54,6 +63,27 @@ class MatchesResponse(TypedDict):
 
 class PotentialMatchesResponse(TypedDict):
     potential_matches: List[MatchData]
+    # opaque cursor for the next page, None on the last page
+    next_cursor: Optional[str]
+
+
+class TopFiveResponse(TypedDict):
+    # best match first
+    top_five: List[MatchData]
+
+
+# users shown to the requester that should not be suggested again
+class SeenRequest(TypedDict):
+    user_ids: List[int]
+
+
+class SwipeData(TypedDict):
+    user_id: int
+    liked: bool
+
+
+class SwipesRequest(TypedDict):
+    swipes: List[SwipeData]
 
 
 class LoginData(TypedDict):
@@ -77,3 +107,24 @@ class LogoutData(TypedDict):
 # indexes of photos that will be updated
 class PresignedUrlsRequest(TypedDict):
     photo_indexes: List[int]
+
+
+# indexes of photos that have been uploaded
+class PhotoUploadCompleteRequest(TypedDict):
+    photo_indexes: List[int]
+
+
+# one photo slot in Profile.photos, see users/photo_manifest.py
+class PhotoEntry(TypedDict):
+    key: str
+    # sha256 of the uploaded file, truncated
+    hash: Optional[str]
+    width: Optional[int]
+    height: Optional[int]
+    # size name -> object key
+    derivatives: Dict[str, str]
+
+
+class PhotosResponse(TypedDict):
+    # slot -> photo, as rendered by photo_manifest.render_manifest
+    photos: Dict[str, dict]
@@ -1,10 +1,14 @@
 from django.urls import path
-from . import views
+from . import login, views
 
 
 urlpatterns = [
     path("potential_matches/", views.get_potential_matches,
          name="potential_matches"),
+    path("top_five/", views.get_top_five, name="top_five"),
+    path("matches/", views.get_matches, name="matches"),
+    path("mark_seen/", views.mark_seen, name="mark_seen"),
+    path("swipes/", views.record_swipes, name="swipes"),
 
     path("signup/", views.create_user, name="signup"),
     path("user_by_id/<int:user_id>/", views.get_user, name="user_by_id"),
@@ -15,11 +19,15 @@ urlpatterns = [
          views.update_profile, name="update_profile"),
 
     path("login/", views.login_view, name="login"),
+    path("login/token/", login.token_login, name="token_login"),
     path("logout/", views.logout_view, name="logout"),
     path("change_password/", views.change_password, name="change_password"),
     path("reset_password/", views.reset_password, name="reset_password"),
     path("get_profile/<int:user_id>/", views.get_profile, name="get_profile"),
+    path("profiles/", views.get_profiles, name="profiles"),
     path('profile_choices/', views.get_profile_choices, name='profile_choices'),
     path('get_presigned_urls/<int:user_id>/',
          views.get_presigned_urls, name='get_presigned_urls'),
+    path('complete_photo_upload/<int:user_id>/',
+         views.complete_photo_upload, name='complete_photo_upload'),
 ]
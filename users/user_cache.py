@@ -0,0 +1,59 @@
+"""
+Short-lived cache of User rows by id, shared by the JWT authentication
+class and get_user_from_db so most requests resolve their users without a
+query. The password hash is never cached: cached users have it deferred,
+so code that needs it (change_password) reads it from the database.
+
+Entries are dropped whenever the user is saved or deleted; other processes
+may keep a copy for up to USER_CACHE_LOCAL_TTL seconds. QuerySet.update()
+and bulk_update() send no signals, so code writing users that way must
+call user_cache.invalidate() itself (LoginBookkeeping's last_login stamps
+are left to expire).
+"""
+import copy
+from typing import Optional
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .caching import TwoTierCache
+from .models import User
+
+user_cache = TwoTierCache(
+    'user_cache',
+    ttl=settings.USER_CACHE_TTL,
+    local_size=settings.USER_CACHE_LOCAL_SIZE,
+    local_ttl=settings.USER_CACHE_LOCAL_TTL,
+)
+
+
+def _detached(user: User) -> User:
+    # callers get their own instance, so related objects they load or
+    # fields they set never leak into the cache or another request
+    user = copy.copy(user)
+    user._state.fields_cache = {}
+    return user
+
+
+def get_cached_user(user_id: int) -> Optional[User]:
+    user = user_cache.get(user_id)
+    return _detached(user) if user is not None else None
+
+
+def cache_user(user: User) -> None:
+    """Cache a fully loaded user (not one loaded with only()/defer())"""
+    user = _detached(user)
+    if api_settings.CHECK_REVOKE_TOKEN:
+        # what the token revocation check compares, see CachedJWTAuthentication
+        user.password_claim = get_md5_hash_password(user.password)
+    # deferred from here on, i.e. loaded from the database on access
+    user.__dict__.pop('password', None)
+    user_cache.fill(user.pk, user)
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance: User, **kwargs):
+    user_cache.invalidate(instance.pk)
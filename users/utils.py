@@ -1,11 +1,37 @@
+from typing import Iterable, Optional
 from users.models import User
+from users.photo_manifest import list_picture_url
+from users.types import MatchData
+from users.user_cache import cache_user, get_cached_user
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import status
 from rest_framework.response import Response
 
 
-def get_user_from_db(user_id: int) -> User | Response:
+def get_user_from_db(user_id: int, only: Optional[Iterable[str]] = None,
+                     cached: bool = True) -> User | Response:
+    """
+    Pass cached=False to read the row itself, e.g. before saving every
+    field of it back.
+    """
+    if cached:
+        user = get_cached_user(user_id)
+        if user is not None:
+            return user
+
+    users = User.objects.all() if only is None else User.objects.only(*only)
     try:
-        return User.objects.get(id=user_id)
+        user = users.get(id=user_id)
     except ObjectDoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+    if cached and only is None:
+        cache_user(user)
+    return user
+
+
+def user_to_match_data(user: User) -> MatchData:
+    return {
+        'id': user.id,
+        'first_name': user.first_name,
+        'picture_url': list_picture_url(user.profile.photos)
+    }
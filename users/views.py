@@ -1,31 +1,51 @@
-from datetime import date
+import hashlib
 from tokenize import TokenError
 from typing import List
 from django.contrib.auth import logout, authenticate, login
 from django.db import transaction
-from django.db.models import Q
+from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.decorators import permission_classes, api_view
+from rest_framework.decorators import authentication_classes, permission_classes, throttle_classes, api_view
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
-from rest_framework_simplejwt.tokens import RefreshToken
-from botocore.exceptions import NoCredentialsError
-import boto3
+from botocore.exceptions import ClientError, NoCredentialsError
+from PIL import UnidentifiedImageError
 import logging
-import re
 from psycopg import IntegrityError
 
 from topfive import settings
-from users.types import DeleteUserData, LoginData, LogoutData, MatchData, MatchesResponse, PasswordChangeData, PasswordResetData, PotentialMatchesResponse, PresignedUrlsRequest, ProfileData, UserCreateData, UserUpdateData
-from .serializers import UserSerializer, ProfileSerializer
-from .models import Match, User, Profile
-from .utils import get_user_from_db
+from users.types import DeleteUserData, LoginData, LogoutData, MatchData, MatchesResponse, PasswordChangeData, PasswordResetData, PhotoUploadCompleteRequest, PhotosResponse, PotentialMatchesResponse, PresignedUrlsRequest, ProfileData, ProfilesResponse, SeenRequest, SwipesRequest, TopFiveResponse, UserCreateData, UserUpdateData
+from .serializers import PROFILE_EXPANDABLE, UserSerializer, ProfileSerializer, profile_read_queryset, readable_fields, serialize_profile
+from .fieldsets import parse_fieldset
+from .hashing import hashes_passwords
+from .http import IMMUTABLE_MAX_AGE, STATIC_MAX_AGE, if_match_fails, if_none_match, make_etag, not_modified
+from .models import MatchEdge, User, Profile, TopFive
+from .utils import get_user_from_db, user_to_match_data
+from .matching import get_candidate_users, parse_candidate_filters
+from .pagination import encode_cursor, get_page_params
+from .profile_cache import cache_profile, get_cached_profile, select_fields
+from .photo_manifest import MAX_PHOTOS, list_picture_url, render_manifest, unreferenced_keys, without_photos
+from .photos import delete_objects, generate_derivatives
+from .seen import record_seen
+from .storage import photo_key, presign_puts
+from .swipes import swipe_buffer
+from .throttling import AuthRateThrottle
+from .tokens import RefreshToken
+from .top_five import compute_picks, save_picks
 from .choices import *
 
 logger = logging.getLogger(__name__)
 
+MATCH_ROWS_CHUNK_SIZE = 100
+MAX_SEEN_PER_REQUEST = 100
+MAX_SWIPES_PER_REQUEST = 100
+MAX_PROFILES_PER_REQUEST = 50
+# profiles are revalidated with If-None-Match on every view
+PROFILE_CACHE_CONTROL = 'private, no-cache'
+
 # TODO: make a views folder and separate this into files for each view
 '''
 User Views
@@ -34,6 +54,8 @@ User Views
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([AuthRateThrottle])
+@hashes_passwords
 def create_user(request: Request) -> Response:
     user_data: UserCreateData = request.data
     try:
@@ -55,10 +77,19 @@ def create_user(request: Request) -> Response:
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user(request: Request, user_id: int) -> Response:
-    user = get_user_from_db(user_id)
+    try:
+        fields = parse_fieldset(
+            request.query_params, readable_fields(UserSerializer()))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = get_user_from_db(user_id, only=fields)
     if isinstance(user, Response):
         return user
     serializer = UserSerializer(user)
+    if fields is not None:
+        for name in set(serializer.fields) - fields:
+            serializer.fields.pop(name)
     return Response(serializer.data)
 
 
@@ -66,7 +97,7 @@ def get_user(request: Request, user_id: int) -> Response:
 @permission_classes([IsAdminUser])
 @csrf_exempt
 def update_user(request: Request, user_id: int) -> Response:
-    user = get_user_from_db(user_id)
+    user = get_user_from_db(user_id, cached=False)
     if isinstance(user, Response):
         return user
 
@@ -121,13 +152,44 @@ PROFILE
 @permission_classes([IsAuthenticated])
 @csrf_exempt
 def get_profile(request: Request, user_id: int) -> Response:
-    user = get_user_from_db(user_id)
-    if isinstance(user, Response):
-        return user
     try:
-        profile = Profile.objects.get(user=user)
-        serializer = ProfileSerializer(profile)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        fields = parse_fieldset(
+            request.query_params, readable_fields(ProfileSerializer()), PROFILE_EXPANDABLE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    user = None
+    if not request.user.is_staff:
+        # as in get_profiles, inactive users are only visible to staff
+        user = get_user_from_db(user_id)
+        if isinstance(user, Response):
+            return user
+        if not user.is_active:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    entry = get_cached_profile(user_id)
+    if entry is None and request.headers.get('If-None-Match'):
+        # revalidation costs one indexed lookup of the version alone
+        version = Profile.objects.filter(user_id=user_id).values_list(
+            'version', flat=True).first()
+        if version is not None and if_none_match(request, make_etag(version)):
+            return not_modified(make_etag(version), PROFILE_CACHE_CONTROL)
+
+    try:
+        if entry is None:
+            if user is None:
+                user = get_user_from_db(user_id, only=['id'])
+                if isinstance(user, Response):
+                    return user
+            entry = cache_profile(profile_read_queryset().get(user=user))
+
+        version, data = entry
+        if if_none_match(request, make_etag(version)):
+            return not_modified(make_etag(version), PROFILE_CACHE_CONTROL)
+        return Response(select_fields(data, fields), status=status.HTTP_200_OK, headers={
+            'ETag': make_etag(version),
+            'Cache-Control': PROFILE_CACHE_CONTROL,
+        })
     except Profile.DoesNotExist:
         logger.error(f"Profile not found for user_id: {user_id}")
         return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -136,6 +198,53 @@ def get_profile(request: Request, user_id: int) -> Response:
         return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_profiles(request: Request) -> Response:
+    try:
+        user_ids = [int(user_id) for user_id in request.query_params.get(
+            'ids', '').split(',') if user_id.strip()]
+    except ValueError:
+        return Response({'error': 'ids must be a comma separated list of user ids'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not user_ids:
+        return Response({'error': 'No ids provided'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(user_ids) > MAX_PROFILES_PER_REQUEST:
+        return Response({'error': f'At most {MAX_PROFILES_PER_REQUEST} ids per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fields = parse_fieldset(
+            request.query_params, readable_fields(ProfileSerializer()), PROFILE_EXPANDABLE)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # One query for all profiles (plus one per expanded relation); the
+        # visibility check runs in the same query instead of once per id
+        profiles = profile_read_queryset(fields).filter(user_id__in=user_ids)
+        if not request.user.is_staff:
+            profiles = profiles.filter(user__is_active=True)
+        by_user_id = {profile.user_id: profile for profile in profiles}
+
+        response_data: ProfilesResponse = {
+            'profiles': [serialize_profile(by_user_id[user_id], fields)
+                         for user_id in dict.fromkeys(user_ids) if user_id in by_user_id],
+            'not_found': [user_id for user_id in dict.fromkeys(user_ids)
+                          if user_id not in by_user_id],
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(
+            f"Error in get_profiles for user {request.user.id}: {str(e)}")
+        return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _profile_modified(version: int) -> Response:
+    return Response({'error': 'Profile has been modified since it was read'},
+                    status=status.HTTP_412_PRECONDITION_FAILED,
+                    headers={'ETag': make_etag(version)})
+
+
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 @csrf_exempt
@@ -146,33 +255,39 @@ def update_profile(request: Request, user_id: int) -> Response:
         logger.error(f"Profile not found for user_id: {user_id}")
         return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
 
+    if if_match_fails(request, make_etag(profile.version)):
+        return _profile_modified(profile.version)
+
     try:
         update_data: ProfileData = request.data
 
-        # TODO: extract into separate function
-        # TODO: allow deleting pictures
-        if 'picture_urls' in update_data:
-            def find_photo_index(url):
-                match = re.search(r'photo_(\d+)\.[^/]+$', url)
-                if match:
-                    return int(match.group(1))
-                return None
-            photo_indexes = [find_photo_index(url)
-                             for url in update_data['picture_urls']]
-            new_photos_to_save = profile.picture_urls
-            for index, url in zip(photo_indexes, update_data['picture_urls']):
-                if index >= len(new_photos_to_save):
-                    new_photos_to_save.append(url)
-                else:
-                    new_photos_to_save[index] = url
-            update_data['picture_urls'] = new_photos_to_save
+        delete_photos = update_data.get('delete_photos', [])
+        if not isinstance(delete_photos, list) or \
+                not all(isinstance(slot, int) for slot in delete_photos):
+            return Response({'error': 'delete_photos must be a list of photo indexes'},
+                            status=status.HTTP_400_BAD_REQUEST)
         serializer = ProfileSerializer(profile, data=update_data, partial=True)
 
         if serializer.is_valid():
             with transaction.atomic():
+                # the photos are also written by complete_photo_upload, so
+                # save the manifest as it is under the row lock, not as loaded
+                version, photos = Profile.objects.select_for_update().filter(
+                    pk=profile.pk).values_list('version', 'photos').get()
+                # recheck under the row lock so concurrent conditional
+                # writers cannot both pass
+                if request.headers.get('If-Match') and if_match_fails(request, make_etag(version)):
+                    return _profile_modified(version)
+                profile.photos = without_photos(photos, delete_photos)
+                if delete_photos and not profile.photos:
+                    return Response({'error': 'Users must keep at least one photo'},
+                                    status=status.HTTP_400_BAD_REQUEST)
                 serializer.save()
+                deleted = unreferenced_keys(photos, profile.photos)
+                transaction.on_commit(lambda: delete_objects(deleted))
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(serializer.data, status=status.HTTP_200_OK,
+                            headers={'ETag': make_etag(profile.version)})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(
@@ -187,6 +302,8 @@ AUTHENTICATION VIEWS
 
 @ api_view(['POST'])
 @ permission_classes([AllowAny])
+@ throttle_classes([AuthRateThrottle])
+@ hashes_passwords
 def login_view(request: Request) -> Response:
     try:
         data: LoginData = request.data
@@ -234,13 +351,15 @@ def logout_view(request: Request) -> Response:
 
 @ api_view(['POST'])
 @ permission_classes([IsAuthenticated])
+@ throttle_classes([AuthRateThrottle])
+@ hashes_passwords
 def change_password(request: Request) -> Response:
     try:
         data: PasswordChangeData = request.data
         user = request.user
         if user.check_password(data['old_password']):
             user.set_password(data['new_password'])
-            user.save()
+            user.save(update_fields=['password'])
             return Response({'success': 'Password changed successfully'}, status=status.HTTP_200_OK)
         else:
             return Response({'error': 'Incorrect old password'}, status=status.HTTP_400_BAD_REQUEST)
@@ -254,6 +373,8 @@ def change_password(request: Request) -> Response:
 
 @ api_view(['POST'])
 @ permission_classes([AllowAny])
+@ throttle_classes([AuthRateThrottle])
+@ hashes_passwords
 def reset_password(request: Request, user_id: int) -> Response:
     user = get_user_from_db(user_id)
     if isinstance(user, Response):
@@ -261,7 +382,7 @@ def reset_password(request: Request, user_id: int) -> Response:
     try:
         data: PasswordResetData = request.data
         user.set_password(data['new_password'])
-        user.save()
+        user.save(update_fields=['password'])
         return Response({'success': 'Password reset successfully'}, status=status.HTTP_200_OK)
     except KeyError as e:
         return Response({'error': f'Missing required field: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
@@ -275,43 +396,37 @@ Matches VIEWS
 '''
 
 
-def user_to_match_data(user: User) -> MatchData:
-    return {
-        'id': user.id,
-        'first_name': user.first_name,
-        'picture_url': user.profile.picture_urls[0] if user.profile.picture_urls else None
-    }
-
-
 @ api_view(['GET'])
 @ permission_classes([IsAuthenticated])
 def get_potential_matches(request: Request) -> Response:
     try:
-        user_profile = request.user.profile
-        min_age = user_profile.min_preferred_age
-        max_age = user_profile.max_preferred_age
-        preferred_gender = user_profile.preferred_gender
-
-        today = date.today()
-        min_birth_date = date(today.year - max_age, today.month, today.day)
-        max_birth_date = date(today.year - min_age, today.month, today.day)
-
-        potential_matches = User.objects.filter(
-            profile__gender=preferred_gender,
-            birthdate__gte=min_birth_date,
-            birthdate__lte=max_birth_date
-        ).exclude(id=request.user.id)
-
-        # Exclude users who are already matches
-        existing_matches = Match.objects.filter(Q(user1=request.user) | Q(
-            user2=request.user)).values_list('user1', 'user2')
-        existing_match_ids = set(
-            [user_id for match in existing_matches for user_id in match if user_id != request.user.id])
-        potential_matches = potential_matches.exclude(
-            id__in=existing_match_ids)
+        limit, after_id = get_page_params(request.query_params)
+        min_shared_interests, dealbreakers = parse_candidate_filters(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        potential_matches = get_candidate_users(
+            request.user, min_shared_interests, dealbreakers)
+        if after_id is not None:
+            potential_matches = potential_matches.filter(id__gt=after_id)
+
+        # Fetch one extra row to know whether another page exists, and stream
+        # the rows through a server-side cursor instead of caching the queryset
+        rows = potential_matches.select_related('profile').only(
+            'id', 'first_name', 'profile__photos'
+        )[:limit + 1].iterator(chunk_size=MATCH_ROWS_CHUNK_SIZE)
+        page: List[MatchData] = []
+        next_cursor = None
+        for user in rows:
+            if len(page) == limit:
+                next_cursor = encode_cursor(page[-1]['id'])
+                break
+            page.append(user_to_match_data(user))
 
         response_data: PotentialMatchesResponse = {
-            'potential_matches': [user_to_match_data(user) for user in potential_matches]
+            'potential_matches': page,
+            'next_cursor': next_cursor
         }
         return Response(response_data)
     except Exception as e:
@@ -320,20 +435,43 @@ def get_potential_matches(request: Request) -> Response:
         return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@ api_view(['GET'])
+@ permission_classes([IsAuthenticated])
+def get_top_five(request: Request) -> Response:
+    try:
+        # Picks are precomputed by the compute_top_five command, so serving
+        # them is a single primary key lookup
+        picks = TopFive.objects.filter(user_id=request.user.id).values_list(
+            'picks', flat=True).first()
+        if picks is None:
+            # not computed yet (e.g. a new user): compute now and keep it
+            picks = compute_picks(request.user)
+            save_picks([(request.user.id, picks)])
+
+        response_data: TopFiveResponse = {'top_five': picks}
+        return Response(response_data)
+    except Exception as e:
+        logger.error(
+            f"Error in get_top_five for user {request.user.id}: {str(e)}")
+        return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @ api_view(['GET'])
 @ permission_classes([IsAuthenticated])
 def get_matches(request: Request) -> Response:
     try:
-        user_matches = Match.objects.filter(
-            Q(user1=request.user) | Q(user2=request.user))
-        matched_users = []
-        for match in user_matches:
-            matched_user = match.user2 if match.user1 == request.user else match.user1
-            matched_users.append(matched_user)
-
-        response_data: MatchesResponse = {
-            'matches': [user_to_match_data(user) for user in matched_users]
-        }
+        # One index range scan over the user's edges, joined to just the
+        # columns MatchData needs
+        rows = MatchEdge.objects.filter(
+            user=request.user
+        ).order_by('-matched_at').values_list(
+            'other_id', 'other__first_name', 'other__profile__photos')
+        matches: List[MatchData] = [
+            {'id': user_id, 'first_name': first_name, 'picture_url': list_picture_url(photos or {})}
+            for user_id, first_name, photos in rows
+        ]
+
+        response_data: MatchesResponse = {'matches': matches}
         return Response(response_data)
     except Exception as e:
         logger.error(
@@ -341,6 +479,62 @@ def get_matches(request: Request) -> Response:
         return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@ api_view(['POST'])
+@ permission_classes([IsAuthenticated])
+def record_swipes(request: Request) -> Response:
+    data: SwipesRequest = request.data
+    swipes = data.get('swipes')
+    if not isinstance(swipes, list) or not swipes:
+        return Response({'error': 'swipes must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(swipes) > MAX_SWIPES_PER_REQUEST:
+        return Response({'error': f'At most {MAX_SWIPES_PER_REQUEST} swipes per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        decisions = [(swipe['user_id'], swipe['liked']) for swipe in swipes]
+    except (KeyError, TypeError):
+        return Response({'error': 'Each swipe needs a user_id and liked'}, status=status.HTTP_400_BAD_REQUEST)
+    if not all(isinstance(user_id, int) and isinstance(liked, bool) and user_id != request.user.id
+               for user_id, liked in decisions):
+        return Response({'error': 'Invalid swipe'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user_ids = {user_id for user_id, _ in decisions}
+        unknown = user_ids - set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        if unknown:
+            return Response({'error': f'Unknown user_ids: {sorted(unknown)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Buffered and written in bulk; matches show up in get_matches once flushed
+        swipe_buffer.add(request.user.id, decisions)
+        return Response({'accepted': len(decisions)}, status=status.HTTP_202_ACCEPTED)
+    except Exception as e:
+        logger.error(
+            f"Error in record_swipes for user {request.user.id}: {str(e)}")
+        return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@ api_view(['POST'])
+@ permission_classes([IsAuthenticated])
+def mark_seen(request: Request) -> Response:
+    data: SeenRequest = request.data
+    user_ids = data.get('user_ids')
+    if not isinstance(user_ids, list) or not user_ids:
+        return Response({'error': 'user_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(user_ids) > MAX_SEEN_PER_REQUEST:
+        return Response({'error': f'At most {MAX_SEEN_PER_REQUEST} user_ids per request'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not all(isinstance(user_id, int) for user_id in user_ids):
+        return Response({'error': 'user_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        record_seen(request.user.id, user_ids)
+        return Response({'success': 'Marked as seen'}, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(
+            f"Error in mark_seen for user {request.user.id}: {str(e)}")
+        return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 '''
 OTHER VIEWS
 '''
@@ -366,19 +560,8 @@ def get_presigned_urls(request: Request, user_id: int) -> Response:
             return Response({'error': 'This operation would exceed the maximum of 6 photos.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        s3_client = boto3.client('s3',
-                                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                                 region_name=settings.AWS_S3_REGION_NAME)
-
-        presigned_urls: List[str] = []
-        for i in photo_indexes:
-            key = f'user_{user_id}/photo_{i}.jpg'
-            presigned_url = s3_client.generate_presigned_url('put_object',
-                                                             Params={'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
-                                                                     'Key': key},
-                                                             ExpiresIn=3600)
-            presigned_urls.append(presigned_url)
+        presigned_urls: List[str] = presign_puts(
+            photo_key(user_id, i) for i in photo_indexes)
 
         response = {'presigned_urls': presigned_urls}
         return Response(response)
@@ -395,31 +578,102 @@ def get_presigned_urls(request: Request, user_id: int) -> Response:
         return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-@ permission_classes([AllowAny])
+@ api_view(['POST'])
+@ permission_classes([IsAuthenticated])
+def complete_photo_upload(request: Request, user_id: int) -> Response:
+    if request.user.id != user_id and not request.user.is_staff:
+        return Response({'error': 'You do not have permission to change these photos'},
+                        status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        data: PhotoUploadCompleteRequest = request.data
+        photo_indexes: List[int] = data.get('photo_indexes')
+
+        if not photo_indexes:
+            return Response({'error': 'No photo indexes provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(i, int) and 0 <= i < MAX_PHOTOS for i in photo_indexes):
+            return Response({'error': f'Photo indexes must be between 0 and {MAX_PHOTOS - 1}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        manifest = generate_derivatives(user_id, photo_indexes)
+        response_data: PhotosResponse = {'photos': render_manifest(manifest)}
+        return Response(response_data)
+
+    except Profile.DoesNotExist:
+        logger.error(f"Profile not found for user_id: {user_id}")
+        return Response({'error': 'User profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return Response({'error': 'Photo has not been uploaded'}, status=status.HTTP_400_BAD_REQUEST)
+        logger.error(
+            f"Error in complete_photo_upload for user_id {user_id}: {str(e)}")
+        return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except UnidentifiedImageError:
+        return Response({'error': 'Uploaded file is not an image'}, status=status.HTTP_400_BAD_REQUEST)
+    except NoCredentialsError:
+        logger.error("AWS credentials not available")
+        return Response({'error': 'AWS credentials not available'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception as e:
+        logger.error(
+            f"Error in complete_photo_upload for user_id {user_id}: {str(e)}")
+        return Response({'error': 'An unexpected error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _choice_options(choices) -> List[dict]:
+    return [{'value': v, 'label': l} for v, l in choices]
+
+
+# The choices only change on deploy, so the response body is rendered once
+# here and served as bytes; its content hash is the version and the ETag
+PROFILE_CHOICES = {
+    'alcohol': _choice_options(ALCOHOL_CHOICES),
+    'body_type': _choice_options(BODY_TYPE_CHOICES),
+    'cannabis': _choice_options(CANNABIS_CHOICES),
+    'communication_style': _choice_options(COMMUNICATION_STYLE_CHOICES),
+    'diet': _choice_options(DIET_CHOICES),
+    'education': _choice_options(EDUCATION_CHOICES),
+    'ethnicity': _choice_options(ETHNICITY_CHOICES),
+    'exercise': _choice_options(EXERCISE_CHOICES),
+    'gender': _choice_options(GENDER_CHOICES),
+    'interests': _choice_options(INTEREST_CHOICES),
+    'love_languages': _choice_options(LOVE_LANGUAGE_CHOICES),
+    'personality_type': _choice_options(PERSONALITY_TYPE_CHOICES),
+    'pets': _choice_options(PET_CHOICES),
+    'political': _choice_options(POLITICAL_CHOICES),
+    'pronouns': _choice_options(PRONOUN_CHOICES),
+    'relationship_goals': _choice_options(RELATIONSHIP_GOAL_CHOICES),
+    'religion': _choice_options(RELIGION_CHOICES),
+    'sexual_orientation': _choice_options(SEXUAL_ORIENTATION_CHOICES),
+    'sleep_pattern': _choice_options(SLEEP_PATTERN_CHOICES),
+    'social_media_usage': _choice_options(SOCIAL_MEDIA_USAGE_CHOICES),
+    'vaccine_status': _choice_options(VACCINE_STATUS_CHOICES),
+    'zodiac': _choice_options(ZODIAC_CHOICES)
+}
+PROFILE_CHOICES_BODY = JSONRenderer().render(PROFILE_CHOICES)
+PROFILE_CHOICES_VERSION = hashlib.sha256(PROFILE_CHOICES_BODY).hexdigest()[:16]
+PROFILE_CHOICES_ETAG = make_etag(PROFILE_CHOICES_VERSION)
+
+
 @api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
 def get_profile_choices(request):
-    """Return all choice options for profile fields"""
-    return Response({
-        'alcohol': [{'value': v, 'label': l} for v, l in ALCOHOL_CHOICES],
-        'body_type': [{'value': v, 'label': l} for v, l in BODY_TYPE_CHOICES],
-        'cannabis': [{'value': v, 'label': l} for v, l in CANNABIS_CHOICES],
-        'communication_style': [{'value': v, 'label': l} for v, l in COMMUNICATION_STYLE_CHOICES],
-        'diet': [{'value': v, 'label': l} for v, l in DIET_CHOICES],
-        'education': [{'value': v, 'label': l} for v, l in EDUCATION_CHOICES],
-        'ethnicity': [{'value': v, 'label': l} for v, l in ETHNICITY_CHOICES],
-        'exercise': [{'value': v, 'label': l} for v, l in EXERCISE_CHOICES],
-        'gender': [{'value': v, 'label': l} for v, l in GENDER_CHOICES],
-        'interests': [{'value': v, 'label': l} for v, l in INTEREST_CHOICES],
-        'love_languages': [{'value': v, 'label': l} for v, l in LOVE_LANGUAGE_CHOICES],
-        'personality_type': [{'value': v, 'label': l} for v, l in PERSONALITY_TYPE_CHOICES],
-        'pets': [{'value': v, 'label': l} for v, l in PET_CHOICES],
-        'political': [{'value': v, 'label': l} for v, l in POLITICAL_CHOICES],
-        'pronouns': [{'value': v, 'label': l} for v, l in PRONOUN_CHOICES],
-        'relationship_goals': [{'value': v, 'label': l} for v, l in RELATIONSHIP_GOAL_CHOICES],
-        'religion': [{'value': v, 'label': l} for v, l in RELIGION_CHOICES],
-        'sexual_orientation': [{'value': v, 'label': l} for v, l in SEXUAL_ORIENTATION_CHOICES],
-        'sleep_pattern': [{'value': v, 'label': l} for v, l in SLEEP_PATTERN_CHOICES],
-        'social_media_usage': [{'value': v, 'label': l} for v, l in SOCIAL_MEDIA_USAGE_CHOICES],
-        'vaccine_status': [{'value': v, 'label': l} for v, l in VACCINE_STATUS_CHOICES],
-        'zodiac': [{'value': v, 'label': l} for v, l in ZODIAC_CHOICES]
-    })
+    """
+    Return all choice options for profile fields. Clients that request
+    ?v=<X-Choices-Version> get a response that may be cached forever, since
+    any change to the choices changes the version.
+    """
+    if request.query_params.get('v') == PROFILE_CHOICES_VERSION:
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={STATIC_MAX_AGE}'
+
+    if if_none_match(request, PROFILE_CHOICES_ETAG):
+        response = not_modified(PROFILE_CHOICES_ETAG, cache_control)
+    else:
+        response = HttpResponse(
+            PROFILE_CHOICES_BODY, content_type='application/json')
+        response['ETag'] = PROFILE_CHOICES_ETAG
+        response['Cache-Control'] = cache_control
+    response['X-Choices-Version'] = PROFILE_CHOICES_VERSION
+    return response